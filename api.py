@@ -0,0 +1,396 @@
+import asyncio
+import copy
+import json
+import os
+import random
+import re
+import time
+from typing import Callable, Iterable, Iterator, Union
+import aiohttp
+import queries
+
+GRAPHQL_URL = "https://api.politicsandwar.com/graphql"
+# the largest `first` the API accepts
+MAX_PAGE_SIZE = 500
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited by the API, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Paces requests to the API. The refill rate adapts to the API: it is cut in half whenever we get a 429 and creeps back up while requests succeed. The rate limit headers of every response are used to keep the bucket from holding more tokens than the API says we have left.
+    """
+
+    def __init__(self, rate: float = 10, capacity: int = 20, min_rate: float = 0.5):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def sync(self, remaining: int, reset_after: float) -> None:
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset_after > 0:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset_after)
+        self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def throttle(self, retry_after: float) -> None:
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+class PnWClient:
+    """
+    Long-lived client for the PnW API. The bot owns a single instance (`bot.pnw`) which is shared by every command and background task, so connections to the API are pooled and kept alive instead of being set up again for every request.
+
+    Identical queries are coalesced: while a query is in flight, anyone sending the same query waits for that request instead of making their own, and the result is reused for `reuse_window` seconds after it arrives.
+    """
+
+    def __init__(self, api_key: str, *, limit: int = 100, limit_per_host: int = 30, dns_ttl: int = 300, keepalive: float = 60, timeout: float = 60, connect_timeout: float = 10, reuse_window: float = 5, rate: float = 10):
+        self.api_key = api_key
+        self.url = f"{GRAPHQL_URL}?api_key={api_key}"
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.reuse_window = reuse_window
+        self.limiter = TokenBucket(rate, capacity=max(1, round(rate * 2)))
+        self.stats = {}
+        self._session = None
+        self._inflight = {}
+        self._recent = {}
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # the session is created lazily since it has to be made inside the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=self.dns_ttl, keepalive_timeout=self.keepalive)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def _stats(self, name: str) -> dict:
+        return self.stats.setdefault(name, {"requests": 0, "errors": 0, "coalesced": 0, "bytes": 0, "latency": 0.0, "max_latency": 0.0})
+
+    def _record(self, name: str, size: int, latency: float, error: bool = False) -> None:
+        stats = self._stats(name)
+        stats['requests'] += 1
+        stats['bytes'] += size
+        stats['latency'] += latency
+        stats['max_latency'] = max(stats['max_latency'], latency)
+        if error:
+            stats['errors'] += 1
+
+    def _rate_limit(self, resp: aiohttp.ClientResponse) -> None:
+        headers = resp.headers
+        if resp.status == 429:
+            retry_after = float(headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 5)
+            self.limiter.throttle(retry_after)
+            raise RateLimited(retry_after)
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if reset_after is None and headers.get("X-RateLimit-Reset"):
+            reset_after = float(headers["X-RateLimit-Reset"]) - time.time()
+        self.limiter.sync(int(remaining), float(reset_after or 0))
+
+    async def _request(self, method: str, url: str, name: str, limited: bool = False, **kwargs) -> bytes:
+        start = time.perf_counter()
+        try:
+            async with self.session.request(method, url, **kwargs) as resp:
+                if limited:
+                    self._rate_limit(resp)
+                body = await resp.read()
+        except Exception:
+            self._record(name, 0, time.perf_counter() - start, error=True)
+            raise
+        self._record(name, len(body), time.perf_counter() - start)
+        return body
+
+    async def _post(self, query: str, name: str) -> bytes:
+        return await self._request("POST", self.url, name, limited=True, json={"query": query})
+
+    async def _decoded(self, query: str, name: str) -> dict:
+        return json.loads(await self._post(query, name))
+
+    def _finish(self, key: tuple, task: asyncio.Task) -> None:
+        del self._inflight[key]
+        if self.reuse_window <= 0 or task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        for old in [old for old, (expires, _) in self._recent.items() if expires <= now]:
+            del self._recent[old]
+        self._recent[key] = (now + self.reuse_window, task.result())
+
+    async def _shared(self, key: tuple, name: str, fetch: Callable, mutable: bool):
+        recent = self._recent.get(key)
+        if recent is not None and recent[0] > time.monotonic():
+            self._stats(name)['coalesced'] += 1
+            return copy.deepcopy(recent[1]) if mutable else recent[1]
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fetch())
+            entry = self._inflight[key] = [task, 1]
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self._stats(name)['coalesced'] += 1
+            entry[1] += 1
+        # the request runs in its own task, so a caller being cancelled doesn't cancel it for everyone else
+        result = await asyncio.shield(entry[0])
+        if not mutable or (entry[1] == 1 and self.reuse_window <= 0):
+            return result
+        return copy.deepcopy(result)
+
+    async def query(self, query: str, name: str = "unnamed", share: bool = True) -> dict:
+        """
+        Sends a GraphQL query and returns the decoded response.
+        :param query: The GraphQL query.
+        :param name: What the query is used for. Requests, bytes and latency are counted per name.
+        :param share: Whether the query may be coalesced with identical queries from other callers.
+        :return: The decoded JSON body. Every caller gets its own copy, so it is safe to modify.
+        """
+        if not share:
+            return await self._decoded(query, name)
+        return await self._shared(("json", query), name, lambda: self._decoded(query, name), True)
+
+    async def query_raw(self, query: str, name: str = "unnamed", share: bool = True) -> str:
+        """
+        Like `query`, but returns the body undecoded so that it can be streamed with `iter_nations`. Since strings can't be modified, coalesced callers share the same body without copying it.
+        """
+        async def fetch():
+            return (await self._post(query, name)).decode("utf-8")
+        if not share:
+            return await fetch()
+        return await self._shared(("raw", query), name, fetch, False)
+
+    async def fetch_nations(self, ids: Iterable[Union[int, str]], fields: queries.Fragment, name: str = "fetch_nations", **args) -> dict:
+        """
+        Fetches nations by id, packing up to `MAX_PAGE_SIZE` ids into every request.
+        :param fields: The fields to select for every nation. `id` is always selected.
+        :param args: Any other arguments for `nations`, for example `vmode`.
+        :return: The nations that were found, keyed by id.
+        """
+        ids = list(dict.fromkeys(str(i) for i in ids if str(i).isdigit()))
+        fields = queries.Fragment("id") + fields
+        chunks = [ids[i:i+MAX_PAGE_SIZE] for i in range(0, len(ids), MAX_PAGE_SIZE)]
+        results = await asyncio.gather(*[self.query(queries.nations(fields, id=chunk, first=len(chunk), **args), name) for chunk in chunks])
+        nations = {}
+        for result in results:
+            if not result.get('data'):
+                raise ValueError(f"No data in response: {result.get('errors')}")
+            for nation in result['data']['nations']['data']:
+                nations[nation['id']] = nation
+        return nations
+
+    async def get_text(self, url: str, name: str = "unnamed") -> str:
+        """
+        Sends a GET request to `url` through the shared session, and returns the body as text.
+        """
+        body = await self._request("GET", url, name)
+        return body.decode("utf-8", errors="replace")
+
+    async def download(self, url: str, path: str, name: str = "unnamed", chunk_size: int = 65536) -> int:
+        """
+        Streams the body of a GET request to `path` in chunks, so that large files are never held in memory. The file is written next to `path` first and moved into place once complete. There is no limit on the total time the download may take, only on how long a single read may stall.
+        :return: The number of bytes downloaded.
+        """
+        start = time.perf_counter()
+        part = f"{path}.part"
+        size = 0
+        try:
+            timeout = aiohttp.ClientTimeout(total=None, connect=self.timeout.connect, sock_read=self.timeout.total)
+            async with self.session.get(url, timeout=timeout) as resp:
+                resp.raise_for_status()
+                with open(part, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(part, path)
+        except Exception:
+            self._record(name, size, time.perf_counter() - start, error=True)
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        self._record(name, size, time.perf_counter() - start)
+        return size
+
+    def summary(self) -> str:
+        lines = []
+        for name, stats in sorted(self.stats.items(), key=lambda k: k[1]['requests'], reverse=True):
+            avg = stats['latency'] / max(stats['requests'], 1) * 1000
+            lines.append(f"{name}: {stats['requests']:,} requests, {stats['coalesced']:,} coalesced, {stats['errors']:,} errors, {stats['bytes'] / 1024:,.0f} KiB, {avg:,.0f}ms avg, {stats['max_latency'] * 1000:,.0f}ms max")
+        return "\n".join(lines)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+_NATIONS = re.compile(r'"nations"\s*:\s*\{(?:[^\[]*?,)?\s*"data"\s*:\s*\[')
+_decoder = json.JSONDecoder()
+
+def find_nations(text: str) -> int:
+    """
+    Returns the position right after the opening bracket of the `nations` data in a response body.
+    """
+    match = _NATIONS.search(text)
+    if match is None:
+        raise ValueError(f"No nations in response: {text[:200]}")
+    return match.end()
+
+def _skip(text: str, pos: int, depth: int) -> int:
+    # jumps past the end of the object or list we are `depth` levels into, without decoding anything
+    for match in _TOKENS.finditer(text, pos):
+        token = match.group()
+        if token[0] == '"':
+            continue
+        depth += 1 if token in "[{" else -1
+        if depth == 0:
+            return match.end()
+    raise ValueError("Unexpected end of response")
+
+def _nation(text: str, pos: int, keep: Union[Callable[[dict], bool], None]) -> tuple:
+    nation = {}
+    pos += 1
+    while True:
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos] == "}":
+            if keep is not None and not keep(nation):
+                nation = None
+            return nation, pos + 1
+        key, pos = json.decoder.scanstring(text, pos + 1)
+        pos = _WHITESPACE.match(text, pos).end() + 1
+        pos = _WHITESPACE.match(text, pos).end()
+        if keep is not None and text[pos] in "[{":
+            # scalar fields are selected before nested ones, so everything the filter looks at is known by now
+            if not keep(nation):
+                return None, _skip(text, pos, 1)
+            keep = None
+        nation[key], pos = _decoder.raw_decode(text, pos)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos] == ",":
+            pos += 1
+
+def iter_nations(text: str, keep: Callable[[dict], bool] = None) -> Iterator[dict]:
+    """
+    Yields the nations of a `nations` response body one by one as they are decoded.
+    :param text: The response body, as returned by `PnWClient.query_raw`.
+    :param keep: Called with the scalar fields of every nation before its nested fields (wars, cities, etc.) are decoded. Nations it returns False for are skipped without being decoded any further.
+    """
+    pos = find_nations(text)
+    while True:
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos] == "]":
+            return
+        if text[pos] == ",":
+            pos += 1
+            continue
+        nation, pos = _nation(text, pos, keep)
+        if nation is not None:
+            yield nation
+
+class PageScheduler:
+    """
+    Fetches the pages of a paginated query. At most `concurrency` pages are requested at a time, every request waits for a token from the client's rate limiter, and pages that fail are retried with jittered exponential backoff. Pages that still fail after `retries` retries are given up on and listed in `failed`.
+
+    With `raw`, pages are returned as undecoded `nations` bodies for `iter_nations`. Without `share`, pages are never coalesced with other callers' queries, which spares background fetches the copies that sharing takes.
+    """
+
+    def __init__(self, pnw: PnWClient, build_query: Callable[[int], str], name: str, *, concurrency: int = 8, retries: int = 4, backoff: float = 1, raw: bool = False, share: bool = True, on_progress: Callable = None):
+        self.pnw = pnw
+        self.raw = raw
+        self.share = share
+        self.build_query = build_query
+        self.name = name
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.on_progress = on_progress
+        self.total = 0
+        self.done = 0
+        self.errors = 0
+        self.failed = []
+
+    async def _fetch(self, page: int) -> Union[dict, None]:
+        for attempt in range(self.retries + 1):
+            await self.pnw.limiter.acquire()
+            try:
+                if self.raw:
+                    result = await self.pnw.query_raw(self.build_query(page), self.name, share=self.share)
+                    find_nations(result)
+                else:
+                    result = await self.pnw.query(self.build_query(page), self.name, share=self.share)
+                    if not result.get('data'):
+                        raise ValueError(f"No data in response: {result.get('errors')}")
+                return result
+            except Exception as error:
+                self.errors += 1
+                if not isinstance(error, (RateLimited, aiohttp.ClientError, asyncio.TimeoutError, ValueError)):
+                    print(f"Unexpected error while fetching page {page} of {self.name}: {error!r}")
+            if attempt < self.retries:
+                await asyncio.sleep(min(60, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5))
+        self.failed.append(page)
+        return None
+
+    async def stream(self, pages: Iterable[int]):
+        """
+        Yields `(page, result)` as pages complete, in no particular order. `result` is None for pages that could not be fetched.
+        """
+        pages = list(pages)
+        self.total += len(pages)
+        todo = asyncio.Queue()
+        for page in pages:
+            todo.put_nowait(page)
+        finished = asyncio.Queue()
+
+        async def worker():
+            while not todo.empty():
+                page = todo.get_nowait()
+                finished.put_nowait((page, await self._fetch(page)))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.concurrency, len(pages)))]
+        try:
+            for _ in pages:
+                page, result = await finished.get()
+                self.done += 1
+                if self.on_progress:
+                    await self.on_progress(self.done, self.total)
+                yield page, result
+        finally:
+            for worker_task in workers:
+                worker_task.cancel()
+
+    async def run(self, pages: Iterable[int]) -> list:
+        """
+        Fetches all `pages` and returns the results in page order, leaving out pages that could not be fetched.
+        """
+        results = {}
+        async for page, result in self.stream(pages):
+            if result is not None:
+                results[page] = result
+        return [results[page] for page in sorted(results)]
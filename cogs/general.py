@@ -1,7 +1,6 @@
 import os
 from discord.ext import commands
 import discord
-import requests
 from datetime import datetime, timedelta
 import pathlib
 import math
@@ -10,21 +9,38 @@ import re
 from keep_alive import app
 from flask.views import MethodView
 from discord.commands import slash_command, Option
-import dload
+import asyncio
+import zipfile
 from csv import DictReader
 import utils
-import pymongo
-
-client = pymongo.MongoClient(os.getenv("pymongolink"))
-version = os.getenv("version")
-mongo = client[str(version)]
-
-api_key = os.getenv("api_key")
+import queries
 
 class General(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.cities_lock = asyncio.Lock()
+
+    async def get_cities_csv(self, date: str) -> pathlib.Path:
+        """
+        Returns the path to the cities CSV of `date`, downloading and unzipping it first if it is not there yet.
+        """
+        folder = pathlib.Path.cwd() / 'data'
+        path = folder / f'cities-{date}.csv'
+        async with self.cities_lock:
+            if os.path.isfile(path):
+                return path
+            folder.mkdir(exist_ok=True)
+            archive = folder / f'cities-{date}.csv.zip'
+            await self.bot.pnw.download(f"https://politicsandwar.com/data/cities/cities-{date}.csv.zip", str(archive), "cities_csv")
+
+            def unzip():
+                with zipfile.ZipFile(archive) as zf:
+                    zf.extractall(folder)
+                os.remove(archive)
+
+            await asyncio.get_running_loop().run_in_executor(None, unzip)
+        return path
 
     @slash_command(
         name="builds",
@@ -43,21 +59,16 @@ class General(commands.Cog):
         now = datetime.now()
         yesterday = now + timedelta(days=-1)
         date = yesterday.strftime("%Y-%m-%d")
-        if os.path.isfile(pathlib.Path.cwd() / 'data' / f'cities-{date}.csv'):
-            #print('That file already exists')
-            pass
-        else:
-            dload.save_unzip(f"https://politicsandwar.com/data/cities/cities-{date}.csv.zip", str(
-                pathlib.Path.cwd() / 'data'), True)
+        csv_path = await self.get_cities_csv(date)
         
         if person == None:
             person = ctx.author.id
-        db_nation = utils.find_nation_plus(self, person)
+        db_nation = await utils.find_nation_plus(self.bot.db, self, person)
         if not db_nation:
             await ctx.edit(content="I could not find the specified person!")
             return
 
-        nation = requests.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{nations(first:1 id:{db_nation['id']}){{data{{id continent date color dompolicy alliance{{name}} alliance_id num_cities ironw bauxitew armss egr massirr itc recycling_initiative telecom_satellite green_tech clinical_research_center specialized_police_training uap}}}}}}"}).json()['data']['nations']['data']
+        nation = (await self.bot.pnw.query(queries.nations(queries.BUILDS, first=1, id=db_nation['id']), "builds"))['data']['nations']['data']
         if len(nation) == 0:
             await ctx.edit(content="That person was not in the API!")
             return
@@ -77,7 +88,6 @@ class General(commands.Cog):
             await ctx.edit(content="I did not understand that mmr, please try again!")
             return
 
-        to_scan = []
         rss = []
         all_rss = ['net income', 'aluminum', 'bauxite', 'coal', 'food', 'gasoline', 'iron', 'lead', 'money', 'munitions', 'oil', 'steel', 'uranium']
         if nation['continent'] == "af":
@@ -101,76 +111,82 @@ class General(commands.Cog):
 
         await ctx.edit(content="Scanning cities...")
 
-        with open(pathlib.Path.cwd() / 'data' / f'cities-{date}.csv', encoding='cp437') as f1:
-            csv_dict_reader = DictReader(f1)
-            nation_age = nation['date'][:nation['date'].index(" ")]
-            for city in csv_dict_reader:
-                if str(infra).lower() not in "any":
-                    if float(city['infrastructure']) != float(infra):
-                        continue
-                    if int(infra) / 50 < int(city['oil_power_plants']) + int(city['nuclear_power_plants']) + int(city['wind_power_plants']) + int(city['coal_power_plants']) + int(city['coal_mines']) + int(city['oil_wells']) + int(city['uranium_mines']) + int(city['iron_mines']) + int(city['lead_mines']) + int(city['bauxite_mines']) + int(city['farms']) + int(city['police_stations']) + int(city['hospitals']) + int(city['recycling_centers']) + int(city['subway']) + int(city['supermarkets']) + int(city['banks']) + int(city['shopping_malls']) + int(city['stadiums']) + int(city['oil_refineries']) + int(city['aluminum_refineries']) + int(city['steel_mills']) + int(city['munitions_factories']) + int(city['barracks']) + int(city['factories']) + int(city['hangars']) + int(city['drydocks']):
-                        continue
-                if str(mmr).lower() not in "any":
-                    if int(city['barracks']) < min_bar:
-                        continue
-                    if int(city['factories']) < min_fac:
-                        continue
-                    if int(city['hangars']) < min_han:
-                        continue
-                    if int(city['drydocks']) < min_dry:
-                        continue
+        def scan_cities():
+            # reading the whole CSV takes a while, so it is done in a worker thread
+            to_scan = []
+            with open(csv_path, encoding='cp437') as f1:
+                csv_dict_reader = DictReader(f1)
+                nation_age = nation['date'][:nation['date'].index(" ")]
+                for city in csv_dict_reader:
+                    if str(infra).lower() not in "any":
+                        if float(city['infrastructure']) != float(infra):
+                            continue
+                        if int(infra) / 50 < int(city['oil_power_plants']) + int(city['nuclear_power_plants']) + int(city['wind_power_plants']) + int(city['coal_power_plants']) + int(city['coal_mines']) + int(city['oil_wells']) + int(city['uranium_mines']) + int(city['iron_mines']) + int(city['lead_mines']) + int(city['bauxite_mines']) + int(city['farms']) + int(city['police_stations']) + int(city['hospitals']) + int(city['recycling_centers']) + int(city['subway']) + int(city['supermarkets']) + int(city['banks']) + int(city['shopping_malls']) + int(city['stadiums']) + int(city['oil_refineries']) + int(city['aluminum_refineries']) + int(city['steel_mills']) + int(city['munitions_factories']) + int(city['barracks']) + int(city['factories']) + int(city['hangars']) + int(city['drydocks']):
+                            continue
+                    if str(mmr).lower() not in "any":
+                        if int(city['barracks']) < min_bar:
+                            continue
+                        if int(city['factories']) < min_fac:
+                            continue
+                        if int(city['hangars']) < min_han:
+                            continue
+                        if int(city['drydocks']) < min_dry:
+                            continue
                 
-                skip = False
-                for mine in cont_rss:
-                    if int(city[mine]) > 0:
-                        skip = True
-                        break
-                if skip:
-                    continue
+                    skip = False
+                    for mine in cont_rss:
+                        if int(city[mine]) > 0:
+                            skip = True
+                            break
+                    if skip:
+                        continue
                 
-                city.pop('\u2229\u2557\u2510city_id')
-                city.pop('nation_id')
-                city.pop('date_created')
-                city.pop('name')
-                city.pop('capital')
-                city.pop('maxinfra')
-                city.pop('last_nuke_date')
-
-                city['powered'] = "am powered" #must be string to work when being in the webpage
-                city['land'] = land
-                city['date'] = nation_age
-                city['infrastructure'] = round(float(city['infrastructure']))
-                city['oilpower'] = int(city.pop('oil_power_plants'))
-                city['windpower'] = int(city.pop('wind_power_plants'))
-                city['coalpower'] = int(city.pop('coal_power_plants'))
-                city['nuclearpower'] = int(city.pop('nuclear_power_plants'))
-                city['coalmine'] = int(city.pop('coal_mines'))
-                city['oilwell'] = int(city.pop('oil_wells'))
-                city['uramine'] = int(city.pop('uranium_mines'))
-                city['barracks'] = int(city.pop('barracks'))
-                city['farm'] = int(city.pop('farms'))
-                city['policestation'] = int(city.pop('police_stations'))
-                city['hospital'] = int(city.pop('hospitals'))
-                city['recyclingcenter'] = int(city.pop('recycling_centers'))
-                city['subway'] = int(city.pop('subway'))
-                city['supermarket'] = int(city.pop('supermarkets'))
-                city['bank'] = int(city.pop('banks'))
-                city['mall'] = int(city.pop('shopping_malls'))
-                city['stadium'] = int(city.pop('stadiums'))
-                city['leadmine'] = int(city.pop('lead_mines'))
-                city['ironmine'] = int(city.pop('iron_mines'))
-                city['bauxitemine'] = int(city.pop('bauxite_mines'))
-                city['gasrefinery'] = int(city.pop('oil_refineries'))
-                city['aluminumrefinery'] = int(city.pop('aluminum_refineries'))
-                city['steelmill'] = int(city.pop('steel_mills'))
-                city['munitionsfactory'] = int(city.pop('munitions_factories'))
-                city['factory'] = int(city.pop('factories'))
-                city['airforcebase'] = int(city.pop('hangars'))
-                city['drydock'] = int(city.pop('drydocks'))
-
-                to_scan.append(city)
+                    city.pop('\u2229\u2557\u2510city_id')
+                    city.pop('nation_id')
+                    city.pop('date_created')
+                    city.pop('name')
+                    city.pop('capital')
+                    city.pop('maxinfra')
+                    city.pop('last_nuke_date')
+
+                    city['powered'] = "am powered" #must be string to work when being in the webpage
+                    city['land'] = land
+                    city['date'] = nation_age
+                    city['infrastructure'] = round(float(city['infrastructure']))
+                    city['oilpower'] = int(city.pop('oil_power_plants'))
+                    city['windpower'] = int(city.pop('wind_power_plants'))
+                    city['coalpower'] = int(city.pop('coal_power_plants'))
+                    city['nuclearpower'] = int(city.pop('nuclear_power_plants'))
+                    city['coalmine'] = int(city.pop('coal_mines'))
+                    city['oilwell'] = int(city.pop('oil_wells'))
+                    city['uramine'] = int(city.pop('uranium_mines'))
+                    city['barracks'] = int(city.pop('barracks'))
+                    city['farm'] = int(city.pop('farms'))
+                    city['policestation'] = int(city.pop('police_stations'))
+                    city['hospital'] = int(city.pop('hospitals'))
+                    city['recyclingcenter'] = int(city.pop('recycling_centers'))
+                    city['subway'] = int(city.pop('subway'))
+                    city['supermarket'] = int(city.pop('supermarkets'))
+                    city['bank'] = int(city.pop('banks'))
+                    city['mall'] = int(city.pop('shopping_malls'))
+                    city['stadium'] = int(city.pop('stadiums'))
+                    city['leadmine'] = int(city.pop('lead_mines'))
+                    city['ironmine'] = int(city.pop('iron_mines'))
+                    city['bauxitemine'] = int(city.pop('bauxite_mines'))
+                    city['gasrefinery'] = int(city.pop('oil_refineries'))
+                    city['aluminumrefinery'] = int(city.pop('aluminum_refineries'))
+                    city['steelmill'] = int(city.pop('steel_mills'))
+                    city['munitionsfactory'] = int(city.pop('munitions_factories'))
+                    city['factory'] = int(city.pop('factories'))
+                    city['airforcebase'] = int(city.pop('hangars'))
+                    city['drydock'] = int(city.pop('drydocks'))
+
+                    to_scan.append(city)
+            return to_scan
+
+        to_scan = await asyncio.get_running_loop().run_in_executor(None, scan_cities)
         
-        temp, colors, prices, treasures, radiation, seasonal_mod = await utils.pre_revenue_calc(api_key, ctx, query_for_nation=False, parsed_nation=nation)
+        temp, colors, prices, treasures, radiation, seasonal_mod = await utils.pre_revenue_calc(self.bot.pnw, ctx, query_for_nation=False, parsed_nation=nation)
 
         cities = []
         for city in to_scan:
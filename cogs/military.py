@@ -1,28 +1,25 @@
 import discord
 from discord.ext import commands
 from discord.commands import slash_command, Option
-import aiohttp
-import re
 from mako.template import Template
 import asyncio
+import functools
 import random
 import pathlib
-import json
 from typing import Union
 import os
+import time
 from datetime import datetime, timedelta
 import utils
+import api
+import modifiers
+import queries
+import raidcache
+import records
+import scoring
 from keep_alive import app
 from flask.views import MethodView
 from flask import request
-import requests
-import pymongo
-
-client = pymongo.MongoClient(os.getenv("pymongolink"))
-version = os.getenv("version")
-mongo = client[str(version)]
-
-api_key = os.getenv("api_key")
 
 class TargetFinding(commands.Cog):
 
@@ -30,17 +27,7 @@ class TargetFinding(commands.Cog):
         self.bot = bot
 
     def winrate_calc(self, attacker_value, defender_value):
-        try:
-            x = attacker_value / defender_value
-            if x > 2:
-                winrate = 1
-            elif x < 0.4:
-                winrate = 0
-            else:
-                winrate = (12.832883444301027*x**(11)-171.668262561212487*x**(10)+1018.533858483560834*x**(9)-3529.694284997589875*x**(8)+7918.373606722701879*x**(7)-12042.696852729619422*x**(6)+12637.399722721022044*x**(5)-9128.535790660698694*x**(4)+4437.651655224382012*x**(3)-1378.156072477675025*x**(2)+245.439740545813436*x-18.980551645186498)
-        except ZeroDivisionError:
-            winrate = 1
-        return winrate
+        return scoring.winrate(attacker_value, defender_value)
 
     @slash_command(
         name="raids",
@@ -59,508 +46,539 @@ class TargetFinding(commands.Cog):
         asyncio.ensure_future(wait_for_timeout())
 
         invoker = str(ctx.author.id)
-        async with aiohttp.ClientSession() as session:
-            attacker = utils.find_nation_plus(self, ctx.author.id)
-            if not attacker:
-                await ctx.edit(content='I could not find your nation, make sure that you are verified!')
-                return
-            async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{nations(first:1 id:{attacker['id']}){{data{{nation_name score id population soldiers tanks aircraft ships}}}}}}"}) as temp:
-                atck_ntn = (await temp.json())['data']['nations']['data'][0]
-            if atck_ntn == None:
-                await ctx.edit(content='I did not find that person!')
-                return
-            minscore = round(atck_ntn['score'] * 0.75)
-            maxscore = round(atck_ntn['score'] * 1.75)
+        attacker = await utils.find_nation_plus(self.bot.db, self, ctx.author.id)
+        if not attacker:
+            await ctx.edit(content='I could not find your nation, make sure that you are verified!')
+            return
+        atck_ntn = (await self.bot.pnw.query(queries.nations(queries.RAIDS_ATTACKER, first=1, id=attacker['id']), "raids_attacker"))['data']['nations']['data'][0]
+        if atck_ntn == None:
+            await ctx.edit(content='I did not find that person!')
+            return
+        minscore = round(atck_ntn['score'] * 0.75)
+        maxscore = round(atck_ntn['score'] * 1.75)
+        
+        class stage_one(discord.ui.View):
+            @discord.ui.button(label="On discord", style=discord.ButtonStyle.primary)
+            async def callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal webpage
+                webpage = False
+                await i.response.pong()
+                self.stop()
             
-            class stage_one(discord.ui.View):
-                @discord.ui.button(label="On discord", style=discord.ButtonStyle.primary)
-                async def callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal webpage
-                    webpage = False
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="As a webpage", style=discord.ButtonStyle.primary)
-                async def one_two_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal webpage
-                    webpage = True
-                    await i.response.pong()
-                    self.stop()
-                
-                async def interaction_check(self, interaction) -> bool:
-                    if interaction.user != ctx.author:
-                        await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
-                        return False
-                    else:
-                        return True
-                
-                async def on_timeout(self):
-                    await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
+            @discord.ui.button(label="As a webpage", style=discord.ButtonStyle.primary)
+            async def one_two_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal webpage
+                webpage = True
+                await i.response.pong()
+                self.stop()
             
-            fetch_fresh = None
-            class stage_two(discord.ui.View):
-                @discord.ui.button(label="Fetch fresh nation data", style=discord.ButtonStyle.primary)
-                async def primary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal fetch_fresh
-                    fetch_fresh = True
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="Use cached data", style=discord.ButtonStyle.primary)
-                async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal fetch_fresh
-                    fetch_fresh = False
-                    await i.response.pong()
-                    self.stop()
-
-                async def interaction_check(self, interaction) -> bool:
-                    if interaction.user != ctx.author:
-                        await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
-                        return False
-                    else:
-                        return True
-
-            who = None
-            class stage_three(discord.ui.View):
-                @discord.ui.button(label="All nations", style=discord.ButtonStyle.primary)
-                async def primary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal who
-                    who = ""
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="Applicants and nations not in alliances", style=discord.ButtonStyle.primary)
-                async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal who
-                    who = " alliance_id:[0,1]"
-                    await i.response.pong()
-                    self.stop()
-
-                @discord.ui.button(label="Nations not affiliated with any alliance", style=discord.ButtonStyle.primary)
-                async def tertiary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal who
-                    who = " alliance_id:0"
-                    await i.response.pong()
-                    self.stop()
-                
-                async def interaction_check(self, interaction) -> bool:
-                    if interaction.user != ctx.author:
-                        await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
-                        return False
-                    else:
-                        return True
-                
-                async def on_timeout(self):
-                    await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
-                
-                async def on_timeout(self):
-                    await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
-
-            max_wars = None
-            class stage_four(discord.ui.View):
-                @discord.ui.button(label="0", style=discord.ButtonStyle.primary)
-                async def primary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal max_wars
-                    max_wars = 0
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="1 or less", style=discord.ButtonStyle.primary)
-                async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal max_wars
-                    max_wars = 1
-                    await i.response.pong()
-                    self.stop()
-
-                @discord.ui.button(label="2 or less", style=discord.ButtonStyle.primary)
-                async def tertiary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal max_wars
-                    max_wars = 2
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="3 or less", style=discord.ButtonStyle.primary)
-                async def quadrary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal max_wars
-                    max_wars = 3
-                    await i.response.pong()
-                    self.stop()
-                
-                async def interaction_check(self, interaction) -> bool:
-                    if interaction.user != ctx.author:
-                        await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
-                        return False
-                    else:
-                        return True
-                
-                async def on_timeout(self):
-                    await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
-           
-            inactive_limit = None
-            class stage_five(discord.ui.View):
-                @discord.ui.button(label="I don't care", style=discord.ButtonStyle.primary)
-                async def primary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal inactive_limit
-                    inactive_limit = 0
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="7+ days inactive", style=discord.ButtonStyle.primary)
-                async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal inactive_limit
-                    inactive_limit = 7
-                    await i.response.pong()
-                    self.stop()
-
-                @discord.ui.button(label="14+ days inactive", style=discord.ButtonStyle.primary)
-                async def tertiary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal inactive_limit
-                    inactive_limit = 14
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="30+ days inactive", style=discord.ButtonStyle.primary)
-                async def quadrary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal inactive_limit
-                    inactive_limit = 30
-                    await i.response.pong()
-                    self.stop()
-                
-                async def interaction_check(self, interaction) -> bool:
-                    if interaction.user != ctx.author:
-                        await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
-                        return False
-                    else:
-                        return True
-                
-                async def on_timeout(self):
-                    await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
-            
-            beige = None
-            class stage_six(discord.ui.View):
-                @discord.ui.button(label="Yes", style=discord.ButtonStyle.success)
-                async def primary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal beige
-                    beige = True
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="No", style=discord.ButtonStyle.danger)
-                async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal beige
-                    beige = False
-                    await i.response.pong()
-                    self.stop()
-                
-                async def interaction_check(self, interaction) -> bool:
-                    if interaction.user != ctx.author:
-                        await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
-                        return False
-                    else:
-                        return True
-                
-                async def on_timeout(self):
-                    await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
-                                
-            performace_filter = None
-            class stage_seven(discord.ui.View):
-                @discord.ui.button(label="Yes", style=discord.ButtonStyle.success)
-                async def primary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal performace_filter
-                    performace_filter = True
-                    await i.response.pong()
-                    self.stop()
-                
-                @discord.ui.button(label="No", style=discord.ButtonStyle.danger)
-                async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
-                    nonlocal performace_filter
-                    performace_filter = False
-                    await i.response.pong()
-                    self.stop()
-                
-                async def interaction_check(self, interaction) -> bool:
-                    if interaction.user != ctx.author:
-                        await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
-                        return False
-                    else:
-                        return True
-                
-                async def on_timeout(self):
-                    await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
-
-            target_list = []
-            futures = []
-            tot_pages = 0
-            progress = 0
+            async def interaction_check(self, interaction) -> bool:
+                if interaction.user != ctx.author:
+                    await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
+                    return False
+                else:
+                    return True
             
-            async def call_api(url, json):
-                nonlocal progress
-                async with session.post(url, json=json) as temp:
-                    resp = await temp.json()
-                    progress += 1
-                    #print(f"Getting targets... ({progress}/{tot_pages})")
-                    return resp
-           
-            async def fetch_targets():
-                nonlocal tot_pages, progress
-                url = f"https://api.politicsandwar.com/graphql?api_key={api_key}"
-                async with session.post(url, json={'query': f"{{nations(page:1 first:50 min_score:{minscore} max_score:{maxscore} vmode:false {who}){{paginatorInfo{{lastPage}}}}}}"}) as temp1:
-                    tot_pages += (await temp1.json())['data']['nations']['paginatorInfo']['lastPage']
-
-                for n in range(1, tot_pages+1):
-                    json = {'query': f"{{nations(page:{n} first:50 min_score:{minscore} max_score:{maxscore} vmode:false{who}){{data{{id flag nation_name last_active leader_name continent dompolicy population alliance_id beigeturns score color soldiers tanks aircraft ships missiles nukes bounties{{amount war_type}} treasures{{name}} alliance{{name}} wars{{date winner defid turnsleft attacks{{loot_info victor moneystolen}}}} alliance_position num_cities ironw bauxitew armss egr massirr itc recycling_initiative telecom_satellite green_tech clinical_research_center specialized_police_training uap cities{{date powered infrastructure land oilpower windpower coalpower nuclearpower coalmine oilwell uramine barracks farm policestation hospital recyclingcenter subway supermarket bank mall stadium leadmine ironmine bauxitemine gasrefinery aluminumrefinery steelmill munitionsfactory factory airforcebase drydock}}}}}}}}"}
-                    futures.append(asyncio.ensure_future(call_api(url, json)))
+            async def on_timeout(self):
+                await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
+        
+        fetch_fresh = None
+        refresh_shortlist = False
+        class stage_two(discord.ui.View):
+            @discord.ui.button(label="Use cached data, refresh the best targets", style=discord.ButtonStyle.success)
+            async def default_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal fetch_fresh, refresh_shortlist
+                fetch_fresh = False
+                refresh_shortlist = True
+                await i.response.pong()
+                self.stop()
+
+            @discord.ui.button(label="Fetch fresh nation data", style=discord.ButtonStyle.primary)
+            async def primary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal fetch_fresh
+                fetch_fresh = True
+                await i.response.pong()
+                self.stop()
             
-            with open(pathlib.Path.cwd() / 'nations.json', 'r') as json_file:
-                file_content = json.load(json_file)
-                last_fetched = file_content['last_fetched']
-                
-            embed0 = discord.Embed(title=f"Presentation", description="How do you want to get your targets?", color=0xff5100)
-            embed1 = discord.Embed(title=f"Fetching", description=f"Do you want to fetch fresh nation information (slow) or use cached information (quick)? Nation information was last cached <t:{last_fetched}:R>", color=0xff5100)
-            embed2 = discord.Embed(title=f"Filters (1/5)", description="What nations do you want to include?", color=0xff5100)
-            embed3 = discord.Embed(title=f"Filters (2/5)", description="How many active defensive wars should they have?", color=0xff5100)
-            embed4 = discord.Embed(title=f"Filters (3/5)", description="How inactive should they be?", color=0xff5100)
-            embed5 = discord.Embed(title=f"Filters (4/5)", description="Do you want to include beige nations?", color=0xff5100)
-            embed6 = discord.Embed(title=f"Filters (5/5)", description='Do you want to improve performance by filtering out "bad" targets?\n\nMore specifically, this will omit nations with negative income, nations that have a stronger ground force than you, and nations that were previously beiged for $0.', color=0xff5100)
-
-            for embed, view in [(embed0, stage_one()), (embed1, stage_two()), (embed2, stage_three()), (embed3, stage_four()), (embed4, stage_five()), (embed5, stage_six()), (embed6, stage_seven())]:
-                if embed == embed3:
-                    if fetch_fresh:
-                        fetching = asyncio.ensure_future(fetch_targets())   
-                    else:
-                        pass
-                await ctx.edit(content="", embed=embed, view=view)
-                timed_out = await view.wait()
-                if timed_out:
-                    return
+            @discord.ui.button(label="Use cached data", style=discord.ButtonStyle.primary)
+            async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal fetch_fresh
+                fetch_fresh = False
+                await i.response.pong()
+                self.stop()
 
-            await ctx.edit(content="Getting targets...", view=None, embed=None)
-            if fetch_fresh:
-                
-                if progress < tot_pages - 5:
-                    rndm = random.choice(["", "2", "3"])
-                    with open (pathlib.Path.cwd() / 'attachments' / f'waiting{rndm}.gif', 'rb') as gif:
-                        gif = discord.File(gif)
-                    await ctx.edit(file=gif)
-
-                await asyncio.gather(fetching)
-                while progress < tot_pages:
-                    await ctx.edit(content=f"Getting targets... ({progress}/{tot_pages})")
-                    await asyncio.sleep(1)
-
-                done_jobs = await asyncio.gather(*futures)
-            else:
-                done_jobs = [{"data": {"nations": {"data": file_content['nations']}}}]
-
-            await ctx.edit(content="Caching targets...")
-            for done_job in done_jobs:
-                for x in done_job['data']['nations']['data']:
-                    if not minscore < x['score'] < maxscore:
-                        continue
-                    if beige:
-                        pass
-                    else:
-                        if x['color'] == "beige":
-                            continue
-                        else: 
-                            pass
-                    used_slots = 0
-                    for war in x['wars']:
-                        if war['turnsleft'] > 0 and war['defid'] == x['id']:
-                            used_slots += 1
-                        for attack in war['attacks']:
-                            if attack['loot_info']:
-                                attack['loot_info'] = attack['loot_info'].replace("\r\n", "")
-                    if x['alliance_id'] in ["4729", "7531"]:
-                        continue
-                    if used_slots > max_wars:
-                        continue
-                    if (datetime.utcnow() - datetime.strptime(x['last_active'], "%Y-%m-%d %H:%M:%S%z").replace(tzinfo=None)).days < inactive_limit:
-                        continue
-                    target_list.append(x)
-                    
-            if len(target_list) == 0:
-                await ctx.edit(content="No targets matched your criteria!", attachments=[])
-                return
-
-            filters = "No active filters"
-            filter_list = []
-            if not beige or who != "" or max_wars != 3 or performace_filter or inactive_limit != 0:
-                filters = "Active filters: "
-                if not beige:
-                    filter_list.append("hide beige nations")
-                if who != "":
-                    if "1" not in who:
-                        filter_list.append("hide full alliance members")
-                    else:
-                        filter_list.append("hide full alliance members and applicants")
-                if max_wars != 3:
-                    if max_wars == 0:
-                        filter_list.append("0 active wars")
-                    else:
-                        filter_list.append(f"{max_wars} or less active wars")
-                if performace_filter:
-                    filter_list.append('omit "bad" targets')
-                if inactive_limit != 0:
-                    filter_list.append(f"hide nations that logged in within the last {inactive_limit} days")
-                filters = filters + ", ".join(filter_list)
-
-            temp, colors, prices, treasures, radiation, seasonal_mod = await utils.pre_revenue_calc(api_key, ctx, query_for_nation=False, parsed_nation=atck_ntn)
+            async def interaction_check(self, interaction) -> bool:
+                if interaction.user != ctx.author:
+                    await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
+                    return False
+                else:
+                    return True
 
-            await ctx.edit(content='Calculating best targets...')
+        who = None
+        class stage_three(discord.ui.View):
+            @discord.ui.button(label="All nations", style=discord.ButtonStyle.primary)
+            async def primary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal who
+                who = None
+                await i.response.pong()
+                self.stop()
+            
+            @discord.ui.button(label="Applicants and nations not in alliances", style=discord.ButtonStyle.primary)
+            async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal who
+                who = [0, 1]
+                await i.response.pong()
+                self.stop()
+
+            @discord.ui.button(label="Nations not affiliated with any alliance", style=discord.ButtonStyle.primary)
+            async def tertiary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal who
+                who = 0
+                await i.response.pong()
+                self.stop()
+            
+            async def interaction_check(self, interaction) -> bool:
+                if interaction.user != ctx.author:
+                    await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
+                    return False
+                else:
+                    return True
+            
+            async def on_timeout(self):
+                await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
+            
+            async def on_timeout(self):
+                await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
 
-            for target in target_list:
-                embed = discord.Embed(title=f"{target['nation_name']}", url=f"https://politicsandwar.com/nation/id={target['id']}", description=f"{filters}\n\u200b", color=0xff5100)
-                prev_nat_loot = False
-                target['infrastructure'] = 0
-                target['def_slots'] = 0
-                target['time_since_war'] = "14+"
-                
-                if target['wars'] != []:
-                    for war in target['wars']:
-                        if war['date'] == '-0001-11-30 00:00:00':
-                            target['wars'].remove(war)
-                        elif war['defid'] == target['id']:
-                            if war['turnsleft'] > 0:
-                                target['def_slots'] += 1
+        max_wars = None
+        class stage_four(discord.ui.View):
+            @discord.ui.button(label="0", style=discord.ButtonStyle.primary)
+            async def primary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal max_wars
+                max_wars = 0
+                await i.response.pong()
+                self.stop()
+            
+            @discord.ui.button(label="1 or less", style=discord.ButtonStyle.primary)
+            async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal max_wars
+                max_wars = 1
+                await i.response.pong()
+                self.stop()
+
+            @discord.ui.button(label="2 or less", style=discord.ButtonStyle.primary)
+            async def tertiary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal max_wars
+                max_wars = 2
+                await i.response.pong()
+                self.stop()
+            
+            @discord.ui.button(label="3 or less", style=discord.ButtonStyle.primary)
+            async def quadrary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal max_wars
+                max_wars = 3
+                await i.response.pong()
+                self.stop()
+            
+            async def interaction_check(self, interaction) -> bool:
+                if interaction.user != ctx.author:
+                    await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
+                    return False
+                else:
+                    return True
+            
+            async def on_timeout(self):
+                await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
+       
+        inactive_limit = None
+        class stage_five(discord.ui.View):
+            @discord.ui.button(label="I don't care", style=discord.ButtonStyle.primary)
+            async def primary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal inactive_limit
+                inactive_limit = 0
+                await i.response.pong()
+                self.stop()
+            
+            @discord.ui.button(label="7+ days inactive", style=discord.ButtonStyle.primary)
+            async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal inactive_limit
+                inactive_limit = 7
+                await i.response.pong()
+                self.stop()
+
+            @discord.ui.button(label="14+ days inactive", style=discord.ButtonStyle.primary)
+            async def tertiary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal inactive_limit
+                inactive_limit = 14
+                await i.response.pong()
+                self.stop()
+            
+            @discord.ui.button(label="30+ days inactive", style=discord.ButtonStyle.primary)
+            async def quadrary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal inactive_limit
+                inactive_limit = 30
+                await i.response.pong()
+                self.stop()
+            
+            async def interaction_check(self, interaction) -> bool:
+                if interaction.user != ctx.author:
+                    await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
+                    return False
+                else:
+                    return True
+            
+            async def on_timeout(self):
+                await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
+        
+        beige = None
+        class stage_six(discord.ui.View):
+            @discord.ui.button(label="Yes", style=discord.ButtonStyle.success)
+            async def primary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal beige
+                beige = True
+                await i.response.pong()
+                self.stop()
+            
+            @discord.ui.button(label="No", style=discord.ButtonStyle.danger)
+            async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal beige
+                beige = False
+                await i.response.pong()
+                self.stop()
+            
+            async def interaction_check(self, interaction) -> bool:
+                if interaction.user != ctx.author:
+                    await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
+                    return False
+                else:
+                    return True
+            
+            async def on_timeout(self):
+                await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
                             
-                    wars = sorted(target['wars'], key=lambda k: k['date'], reverse=True)
-                    war = wars[0]
-                    if target['def_slots'] == 0:
-                        target['time_since_war'] = (datetime.utcnow() - datetime.strptime(war['date'], "%Y-%m-%d %H:%M:%S%z").replace(tzinfo=None)).days
-                    else:
-                        target['time_since_war'] = "Ongoing"
-                    if war['winner'] in ["0", target['id']]:
-                        pass
-                    else:
-                        nation_loot = 0
-                        prev_nat_loot = True
-                        for attack in war['attacks']:
-                            if attack['victor'] == target['id']:
-                                continue
-                            if attack['loot_info']:
-                                text = attack['loot_info']
-                                if "won the war and looted" in text:
-                                    text = text[text.index('looted') + 7 :text.index(' Food. ')]
-                                    text = re.sub(r"[^0-9-]+", "", text.replace(", ", "-"))
-                                    rss = ['money', 'coal', 'oil', 'uranium', 'iron', 'bauxite', 'lead', 'gasoline', 'munitions', 'steel', 'aluminum', 'food']
-                                    n = 0
-                                    loot = {}
-                                    for sub in text.split("-"):
-                                        loot[rss[n]] = int(sub)
-                                        n += 1
-                                    for rs in rss:
-                                        amount = loot[rs]
-                                        price = int(prices[rs])
-                                        nation_loot += amount * price
-                                else:
-                                    continue
-                        target['nation_loot'] = f"{round(nation_loot):,}"
-                        embed.add_field(name="Previous nation loot", value=f"${round(nation_loot):,}")
-
-                if prev_nat_loot == False:
-                    embed.add_field(name="Previous nation loot", value="NaN")
-                    target['nation_loot'] = "NaN"
-
-                rev_obj = await utils.revenue_calc(ctx, target, radiation, treasures, prices, colors, seasonal_mod)
-
-                target['monetary_net_num'] = rev_obj['monetary_net_num']
-                embed.add_field(name="Monetary Net Income", value=rev_obj['mon_net_txt'])
-                
-                target['net_cash_num'] = rev_obj['net_cash_num']
-                target['money_txt'] = rev_obj['money_txt']
-                embed.add_field(name="Net Cash Income", value=rev_obj['money_txt'])
-
-                target['treasures'] = len(target['treasures'])
-                embed.add_field(name="Treasures", value=target['treasures'])
-
-                embed.add_field(name="Slots", value=f"{target['def_slots']}/3 used slots") 
-
-                if target['last_active'] == '-0001-11-30 00:00:00':
-                    days_inactive = 0
+        performace_filter = None
+        class stage_seven(discord.ui.View):
+            @discord.ui.button(label="Yes", style=discord.ButtonStyle.success)
+            async def primary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal performace_filter
+                performace_filter = True
+                await i.response.pong()
+                self.stop()
+            
+            @discord.ui.button(label="No", style=discord.ButtonStyle.danger)
+            async def secondary_callback(self, b: discord.Button, i: discord.Interaction):
+                nonlocal performace_filter
+                performace_filter = False
+                await i.response.pong()
+                self.stop()
+            
+            async def interaction_check(self, interaction) -> bool:
+                if interaction.user != ctx.author:
+                    await interaction.response.send_message("These buttons are reserved for someone else!", ephemeral=True)
+                    return False
                 else:
-                    days_inactive = (datetime.utcnow() - datetime.strptime(target['last_active'], "%Y-%m-%d %H:%M:%S%z").replace(tzinfo=None)).days
-
-                for city in target['cities']:
-                    target['infrastructure'] += city['infrastructure']
+                    return True
+            
+            async def on_timeout(self):
+                await ctx.edit(content=f"<@{ctx.author.id}> The command timed out!")
 
-                embed.add_field(name="Beige", value=f"{target['beigeturns']} turns")
+        scheduler = None
+        show_progress = False
+        last_progress_edit = 0
 
-                embed.add_field(name="Inactivity", value=f"{days_inactive} days")
+        top = None
+        fetched_pages = asyncio.Queue()
 
-                if target['alliance']:
-                    embed.add_field(name="Alliance", value=f"[{target['alliance']['name']}](https://politicsandwar.com/alliance/id={target['alliance_id']})\n{target['alliance_position'].lower().capitalize()}")
+        async def report_progress(done, total):
+            nonlocal last_progress_edit
+            if not show_progress or time.monotonic() - last_progress_edit < 1.5:
+                return
+            last_progress_edit = time.monotonic()
+            progress = f"Getting targets... ({done}/{total})"
+            if top:
+                best = top.best()
+                progress += f"\nBest target so far: {best['nation_name']} (${best['monetary_net_num']:,} per day)"
+            await ctx.edit(content=progress)
+       
+        async def fetch_targets():
+            # pages are handed over as they arrive, and None marks the end
+            nonlocal scheduler
+            try:
+                tot_pages = (await self.bot.pnw.query(queries.nations(None, paginator=queries.LAST_PAGE, page=1, first=50, min_score=minscore, max_score=maxscore, vmode=False, alliance_id=who), "raids_last_page"))['data']['nations']['paginatorInfo']['lastPage']
+                scheduler = api.PageScheduler(self.bot.pnw, lambda n: queries.nations(queries.RAIDS_TARGET, page=n, first=50, min_score=minscore, max_score=maxscore, vmode=False, alliance_id=who), "raids_page", raw=True)
+                async for page, body in scheduler.stream(range(1, tot_pages+1)):
+                    if body is not None:
+                        fetched_pages.put_nowait((page, body))
+            finally:
+                fetched_pages.put_nowait(None)
+        
+        last_fetched = await self.bot.store.meta("last_fetched", 0)
+        shortlist_size = int(os.getenv("raids_shortlist", 75))
+        results_discord = int(os.getenv("raids_results_discord", 50))
+        results_webpage = int(os.getenv("raids_results_webpage", 500))
+            
+        embed0 = discord.Embed(title=f"Presentation", description="How do you want to get your targets?", color=0xff5100)
+        embed1 = discord.Embed(title=f"Fetching", description=f"Do you want to fetch fresh nation information (slow) or use cached information (quick)? Nation information was last cached <t:{last_fetched}:R>\n\nBy default, targets are picked from the cached information, and the best {shortlist_size} of them are fetched again before they are shown.", color=0xff5100)
+        embed2 = discord.Embed(title=f"Filters (1/5)", description="What nations do you want to include?", color=0xff5100)
+        embed3 = discord.Embed(title=f"Filters (2/5)", description="How many active defensive wars should they have?", color=0xff5100)
+        embed4 = discord.Embed(title=f"Filters (3/5)", description="How inactive should they be?", color=0xff5100)
+        embed5 = discord.Embed(title=f"Filters (4/5)", description="Do you want to include beige nations?", color=0xff5100)
+        embed6 = discord.Embed(title=f"Filters (5/5)", description='Do you want to improve performance by filtering out "bad" targets?\n\nMore specifically, this will omit nations with negative income, nations that have a stronger ground force than you, and nations that were previously beiged for $0.', color=0xff5100)
+
+        for embed, view in [(embed0, stage_one()), (embed1, stage_two()), (embed2, stage_three()), (embed3, stage_four()), (embed4, stage_five()), (embed5, stage_six()), (embed6, stage_seven())]:
+            if embed == embed3:
+                if fetch_fresh:
+                    fetching = asyncio.ensure_future(fetch_targets())   
                 else:
-                    target['alliance'] = {"name": "None"}
-                    embed.add_field(name="Alliance", value=f"No alliance")
-
-                target['max_infra'] = rev_obj['max_infra']
-                target['avg_infra'] = rev_obj['avg_infra']
-                embed.add_field(name="Infra", value=f"Max: {rev_obj['max_infra']}\nAvg: {rev_obj['avg_infra']}")
-
-                embed.add_field(name="Soldiers", value=f"{target['soldiers']:,} soldiers")
+                    pass
+            await ctx.edit(content="", embed=embed, view=view)
+            timed_out = await view.wait()
+            if timed_out:
+                return
 
-                embed.add_field(name="Tanks", value=f"{target['tanks']:,} tanks")
+        await ctx.edit(content="Getting targets...", view=None, embed=None)
+        if fetch_fresh:
+            
+            if scheduler is None or scheduler.done < scheduler.total - 5:
+                rndm = random.choice(["", "2", "3"])
+                with open (pathlib.Path.cwd() / 'attachments' / f'waiting{rndm}.gif', 'rb') as gif:
+                    gif = discord.File(gif)
+                await ctx.edit(file=gif)
+
+        def keep(x):
+            # only looks at scalar fields, so that nations can be dropped before their wars and cities are decoded
+            if not minscore < x['score'] < maxscore:
+                return False
+            if not beige and x['color'] == "beige":
+                return False
+            if x['alliance_id'] in ["4729", "7531"]:
+                return False
+            if (datetime.utcnow() - datetime.strptime(x['last_active'], "%Y-%m-%d %H:%M:%S%z").replace(tzinfo=None)).days < inactive_limit:
+                return False
+            return True
+
+        temp, colors, prices, treasures, radiation, seasonal_mod = await utils.pre_revenue_calc(self.bot.pnw, ctx, query_for_nation=False, parsed_nation=atck_ntn)
+        modifiers_version = modifiers.cache.version
+        price_vector = records.price_vector(prices)
+
+        def slots_available(x, fetched):
+            used_slots = 0
+            for war in x['wars']:
+                if war['turnsleft'] > 0 and war['defid'] == x['id']:
+                    used_slots += 1
+                if fetched:
+                    # the loot of cached nations was already parsed by the scanner
+                    war['loot'] = records.war_loot(war.pop('attacks'), x['id'])
+            return used_slots <= max_wars
+
+        filters = "No active filters"
+        filter_list = []
+        if not beige or who is not None or max_wars != 3 or performace_filter or inactive_limit != 0:
+            filters = "Active filters: "
+            if not beige:
+                filter_list.append("hide beige nations")
+            if who is not None:
+                if who == 0:
+                    filter_list.append("hide full alliance members")
+                else:
+                    filter_list.append("hide full alliance members and applicants")
+            if max_wars != 3:
+                if max_wars == 0:
+                    filter_list.append("0 active wars")
+                else:
+                    filter_list.append(f"{max_wars} or less active wars")
+            if performace_filter:
+                filter_list.append('omit "bad" targets')
+            if inactive_limit != 0:
+                filter_list.append(f"hide nations that logged in within the last {inactive_limit} days")
+            filters = filters + ", ".join(filter_list)
+
+        top = scoring.TopK(results_webpage if webpage else results_discord)
+
+        def prepare(target, revenue=None):
+            # works out everything about a target that doesn't depend on the attacker
+            prev_nat_loot = False
+            target['infrastructure'] = 0
+            target['def_slots'] = 0
+            target['time_since_war'] = "14+"
+            
+            if target['wars'] != []:
+                for war in target['wars']:
+                    if war['date'] == '-0001-11-30 00:00:00':
+                        target['wars'].remove(war)
+                    elif war['defid'] == target['id']:
+                        if war['turnsleft'] > 0:
+                            target['def_slots'] += 1
+                        
+                wars = sorted(target['wars'], key=lambda k: k['date'], reverse=True)
+                war = wars[0]
+                if target['def_slots'] == 0:
+                    target['time_since_war'] = (datetime.utcnow() - datetime.strptime(war['date'], "%Y-%m-%d %H:%M:%S%z").replace(tzinfo=None)).days
+                else:
+                    target['time_since_war'] = "Ongoing"
+                if war['winner'] in ["0", target['id']]:
+                    pass
+                else:
+                    prev_nat_loot = True
+                    nation_loot = records.loot_value(war['loot'], price_vector)
+                    target['nation_loot'] = f"{round(nation_loot):,}"
 
-                embed.add_field(name="Aircraft", value=f"{target['aircraft']} aircraft")
+            if prev_nat_loot == False:
+                target['nation_loot'] = "NaN"
+                nation_loot = float("nan")
 
-                embed.add_field(name="Ships", value=f"{target['ships']:,} ships")
+            if revenue is not None and revenue.version == modifiers_version:
+                # precomputed by the scanner with the modifiers of this turn
+                rev_obj = revenue.to_dict()
+            else:
+                rev_obj = utils.revenue(target, radiation, treasures, prices, colors, seasonal_mod)
 
-                embed.add_field(name="Nukes", value=f"{target['nukes']:,} nukes")
+            target['monetary_net_num'] = rev_obj['monetary_net_num']
+            target['mon_net_txt'] = rev_obj['mon_net_txt']
+            target['net_cash_num'] = rev_obj['net_cash_num']
+            target['money_txt'] = rev_obj['money_txt']
+            target['treasures'] = len(target['treasures'])
 
-                embed.add_field(name="Missiles", value=f"{target['missiles']:,} missiles")
-                
-                # works perfectly fine, but the API is broken....
-                # target['bounty_txt'] = "0"
-                # bounty_info = {"ATTRITION": 0, "RAID": 0, "ORDINARY": 0, "NUCLEAR": 0}
-                # for bounty in target['bounties']:
-                #     if bounty['war_type'] == None:
-                #         bounty['war_type'] = "NUCLEAR"
-                #     bounty_info[bounty['war_type']] += bounty['amount']   
-                # temp_list = []
-                # for k, v in bounty_info.items():
-                #     if v != 0:
-                #         temp_list.append(f"{k.capitalize()}: ${v:,}")
-                # target['bounty_txt'] = ", ".join(temp_list)
-
-                ground_win_rate = self.winrate_calc((atck_ntn['soldiers'] * 1.75 + atck_ntn['tanks'] * 40), (target['soldiers'] * 1.75 + target['tanks'] * 40 + target['population'] * 0.0025))
-
-                target['groundwin'] = ground_win_rate
-                embed.add_field(name="Chance to get ground IT", value=str(round(100*ground_win_rate**3)) + "%")
-
-                air_win_rate = self.winrate_calc((atck_ntn['aircraft'] * 3), (target['aircraft'] * 3))
-                
-                target['airwin'] = air_win_rate
-                embed.add_field(name="Chance to get air IT", value=str(round(100*air_win_rate**3)) + "%")
+            if target['last_active'] == '-0001-11-30 00:00:00':
+                target['days_inactive'] = 0
+            else:
+                target['days_inactive'] = (datetime.utcnow() - datetime.strptime(target['last_active'], "%Y-%m-%d %H:%M:%S%z").replace(tzinfo=None)).days
 
-                naval_win_rate = self.winrate_calc((atck_ntn['ships'] * 4), (target['ships'] * 4))
-                
-                target['navalwin'] = naval_win_rate
-                embed.add_field(name="Chance to get naval IT", value=str(round(100*naval_win_rate**3)) + "%\n\u200b")
+            for city in target['cities']:
+                target['infrastructure'] += city['infrastructure']
 
-                target['winchance'] = round((ground_win_rate+air_win_rate+naval_win_rate)*100/3)
+            target['in_alliance'] = bool(target['alliance'])
+            if not target['alliance']:
+                target['alliance'] = {"name": "None"}
 
-                if not webpage:
-                    target['embed'] = embed
+            target['max_infra'] = rev_obj['max_infra']
+            target['avg_infra'] = rev_obj['avg_infra']
+            
+            # works perfectly fine, but the API is broken....
+            # target['bounty_txt'] = "0"
+            # bounty_info = {"ATTRITION": 0, "RAID": 0, "ORDINARY": 0, "NUCLEAR": 0}
+            # for bounty in target['bounties']:
+            #     if bounty['war_type'] == None:
+            #         bounty['war_type'] = "NUCLEAR"
+            #     bounty_info[bounty['war_type']] += bounty['amount']   
+            # temp_list = []
+            # for k, v in bounty_info.items():
+            #     if v != 0:
+            #         temp_list.append(f"{k.capitalize()}: ${v:,}")
+            # target['bounty_txt'] = ", ".join(temp_list)
+
+            target['loot_value'] = nation_loot
+            return target
+
+        def finish(target, scores, j, position):
+            # scores a prepared target against the attacker, and keeps it if it is one of the best
+            target['groundwin'] = float(scores['groundwin'][j])
+            target['ground_it'] = float(scores['ground_it'][j])
+            target['airwin'] = float(scores['airwin'][j])
+            target['air_it'] = float(scores['air_it'][j])
+            target['navalwin'] = float(scores['navalwin'][j])
+            target['naval_it'] = float(scores['naval_it'][j])
+            target['winchance'] = int(scores['winchance'][j])
+
+            if performace_filter and not scoring.good_target(target['groundwin'], target['loot_value'], target['net_cash_num']):
+                return
+            top.push(target['monetary_net_num'], position, target)
+
+        if fetch_fresh:
+            # every page is filtered, scored and ranked as soon as it arrives, while the next pages are still being fetched
+            show_progress = True
+            while True:
+                fetched_page = await fetched_pages.get()
+                if fetched_page is None:
+                    break
+                page, body = fetched_page
+                page_targets = [x for x in api.iter_nations(body, keep) if slots_available(x, True)]
+                scores = scoring.score(atck_ntn, page_targets)
+                for j, target in enumerate(page_targets):
+                    # positions follow the order of the pages, so that ties are broken the same way however the pages arrive
+                    finish(prepare(target), scores, j, (page - 1) * 50 + j)
+                await report_progress(scheduler.done, scheduler.total)
+            # raises the error that stopped the fetching, if there was one
+            await fetching
+            if scheduler.failed:
+                await ctx.edit(content=f"Getting targets... ({len(scheduler.failed)} pages could not be fetched, so some targets may be missing)")
+        else:
+            bracket_min, bracket_max = raidcache.cache.window(atck_ntn['score'])
+
+            def build_candidates(index):
+                # runs in a worker thread, the index and its nations never change once built
+                candidates = []
+                for nation in index.records(bracket_min, bracket_max, beige=beige, alliance_id=who, exclude_alliances=["4729", "7531"], max_wars=max_wars, inactive_days=inactive_limit):
+                    x = nation.to_dict()
+                    if slots_available(x, False):
+                        # the nation is kept rather than its revenue, since the scanner may compute that after the candidates are cached
+                        candidates.append((x, nation))
+                return candidates
+
+            await ctx.edit(content="Loading cached targets...")
+            index = self.bot.scanner.index
+            if index is not None and len(index):
+                # shared with everyone in the same score bracket who picked the same filters, until the turn changes or the scanner publishes newer data
+                key = raidcache.cache.key(atck_ntn['score'], who=who, max_wars=max_wars, inactive_limit=inactive_limit, beige=beige)
+                candidates = await raidcache.cache.get(key, lambda: asyncio.get_running_loop().run_in_executor(None, build_candidates, index), index.fetched)
+            else:
+                # before the scanner has published anything, there is nothing worth sharing
+                nations = await self.bot.store.candidates(minscore, maxscore, beige=beige, alliance_id=who, exclude_alliances=["4729", "7531"], inactive_days=inactive_limit)
+                candidates = [(x, None) for x in nations if slots_available(x, False)]
+            candidates = [(x, nation) for x, nation in candidates if minscore < x['score'] < maxscore]
+
+            def cached_revenue(nation):
+                if nation is not None and nation.revenue is not None and nation.revenue.version == modifiers_version:
+                    return nation.revenue
+                return None
+
+            def copy(x):
+                # the candidates are shared, and `prepare` removes wars from the list it is given
+                target = dict(x)
+                target['wars'] = list(x['wars'])
+                return target
+
+            if refresh_shortlist and candidates:
+                def cached_income(candidate):
+                    x, nation = candidate
+                    revenue = cached_revenue(nation)
+                    if revenue is not None:
+                        return revenue.monetary_net_num
+                    return utils.revenue(x, radiation, treasures, prices, colors, seasonal_mod)['monetary_net_num']
+
+                # the cached data is only used to pick the targets worth fetching again, they are ranked again with the fresh data below
+                shortlist = sorted(candidates, key=cached_income, reverse=True)[:shortlist_size]
+                await ctx.edit(content=f"Refreshing the best {len(shortlist)} targets...")
+                args = {"vmode": False} if who is None else {"vmode": False, "alliance_id": who}
+                fresh = await self.bot.pnw.fetch_nations([x['id'] for x, nation in shortlist], queries.RAIDS_TARGET, "raids_shortlist", **args)
+                # nations that went into vacation mode or no longer match the filters are dropped
+                candidates = [(x, None) for x in fresh.values() if keep(x) and slots_available(x, True)]
+
+            if len(candidates) == 0:
+                await ctx.edit(content="No targets matched your criteria!", attachments=[])
+                return
 
-            if performace_filter:
-                def determine(x):
-                    if x['groundwin'] < .4 or x['nation_loot'] == "0" or x['net_cash_num'] < 10000:
-                        return False
-                    else:
-                        return True
-                target_list[:] = [target for target in target_list if determine(target)]
-                if len(target_list) == 0:
-                    await ctx.edit(content="No targets matched your criteria!", attachments=[])
-                    return
-                
-        best_targets = sorted(target_list, key=lambda k: k['monetary_net_num'], reverse=True)
+            await ctx.edit(content='Calculating best targets...')
+            scores = scoring.score(atck_ntn, [x for x, nation in candidates])
+            revenues = [cached_revenue(nation) for x, nation in candidates]
+            # the revenue the scanner computed for this turn is exact, targets without one have to be worked out to know
+            bounds = [float("inf") if revenue is None else revenue.monetary_net_num for revenue in revenues]
+            for i in sorted(range(len(candidates)), key=lambda i: bounds[i], reverse=True):
+                if not top.could_enter(bounds[i]):
+                    # no target that is left can make it into the results
+                    break
+                finish(prepare(copy(candidates[i][0]), revenues[i]), scores, i, i)
+
+        if len(top) == 0:
+            await ctx.edit(content="No targets matched your criteria!", attachments=[])
+            return
+        best_targets = top.items()
 
         if webpage:
             endpoint = datetime.utcnow().strftime('%d%H%M%S')
             class webraid(MethodView):
                 def get(raidclass):
-                    beige_alerts = mongo.global_users.find_one({"user": int(invoker)})['beige_alerts']
+                    beige_alerts = asyncio.run_coroutine_threadsafe(self.bot.db.users.get(invoker), self.bot.loop).result()['beige_alerts']
                     with open(pathlib.Path.cwd() / "templates" / "raidspage.txt", "r") as file:
                         template = file.read()
                     result = Template(template).render(attacker=atck_ntn, targets=best_targets, endpoint=endpoint, invoker=str(invoker), beige_alerts=beige_alerts, beige=beige, datetime=datetime)
@@ -577,35 +595,61 @@ class TargetFinding(commands.Cog):
                         time += timedelta(hours=turns*2-1)
                     reminder['time'] = datetime(time.year, time.month, time.day, time.hour)
                     reminder['id'] = str(data['id'])
-                    mongo.global_users.find_one_and_update({"user": int(data['invoker'])}, {"$push": {"beige_alerts": reminder}})
+                    asyncio.run_coroutine_threadsafe(self.bot.db.users.add_beige_alert(data['invoker'], reminder), self.bot.loop).result()
                     return "you good"
 
             app.add_url_rule(f"/raids/{endpoint}", view_func=webraid.as_view(str(datetime.utcnow())), methods=["GET", "POST"]) # this solution of adding a new page instead of updating an existing for the same nation is kinda dependent on the bot resetting every once in a while, bringing down all the endpoints
             await ctx.edit(content=f"Go to https://autolycus.politicsandwar.repl.co/raids/{endpoint}", attachments=[])
             return
         
-        pages = len(target_list)
+        # only the fields the embeds show are kept, the embeds themselves are made when their page is first shown
+        for target in best_targets:
+            del target['cities'], target['wars']
+        pages = len(best_targets)
         cur_page = 1
 
-        def get_embed(nation):
-            nonlocal tot_pages, cur_page
-            embed = nation['embed']
-            if "*" in nation['money_txt']:
-                embed.set_footer(text=f"Page {cur_page}/{pages}  |  * the income if the nation is out of food.")
+        @functools.lru_cache(maxsize=8)
+        def page_embed(page):
+            target = best_targets[page-1]
+            embed = discord.Embed(title=f"{target['nation_name']}", url=f"https://politicsandwar.com/nation/id={target['id']}", description=f"{filters}\n\u200b", color=0xff5100)
+            embed.add_field(name="Previous nation loot", value=f"${target['nation_loot']}" if target['nation_loot'] != "NaN" else "NaN")
+            embed.add_field(name="Monetary Net Income", value=target['mon_net_txt'])
+            embed.add_field(name="Net Cash Income", value=target['money_txt'])
+            embed.add_field(name="Treasures", value=target['treasures'])
+            embed.add_field(name="Slots", value=f"{target['def_slots']}/3 used slots") 
+            embed.add_field(name="Beige", value=f"{target['beigeturns']} turns")
+            embed.add_field(name="Inactivity", value=f"{target['days_inactive']} days")
+            if target['in_alliance']:
+                embed.add_field(name="Alliance", value=f"[{target['alliance']['name']}](https://politicsandwar.com/alliance/id={target['alliance_id']})\n{target['alliance_position'].lower().capitalize()}")
+            else:
+                embed.add_field(name="Alliance", value=f"No alliance")
+            embed.add_field(name="Infra", value=f"Max: {target['max_infra']}\nAvg: {target['avg_infra']}")
+            embed.add_field(name="Soldiers", value=f"{target['soldiers']:,} soldiers")
+            embed.add_field(name="Tanks", value=f"{target['tanks']:,} tanks")
+            embed.add_field(name="Aircraft", value=f"{target['aircraft']} aircraft")
+            embed.add_field(name="Ships", value=f"{target['ships']:,} ships")
+            embed.add_field(name="Nukes", value=f"{target['nukes']:,} nukes")
+            embed.add_field(name="Missiles", value=f"{target['missiles']:,} missiles")
+            embed.add_field(name="Chance to get ground IT", value=str(round(100*target['ground_it'])) + "%")
+            embed.add_field(name="Chance to get air IT", value=str(round(100*target['air_it'])) + "%")
+            embed.add_field(name="Chance to get naval IT", value=str(round(100*target['naval_it'])) + "%\n\u200b")
+            if "*" in target['money_txt']:
+                embed.set_footer(text=f"Page {page}/{pages}  |  * the income if the nation is out of food.")
             else:
-                embed.set_footer(text=f"Page {cur_page}/{pages}")
+                embed.set_footer(text=f"Page {page}/{pages}")
             return embed
 
-        msg_embd = get_embed(best_targets[0])
+        msg_embd = page_embed(cur_page)
         timed_out = False
 
+        db = self.bot.db
         class embed_paginator(discord.ui.View):
             def __init__(self):
                 super().__init__(timeout=900)
 
-            def button_check(self, x):
+            async def button_check(self, x):
                 beige_button = [x for x in self.children if x.custom_id == "beige"][0]
-                user = mongo.global_users.find_one({"user": ctx.author.id})
+                user = await db.users.get(ctx.author.id)
                 for entry in user['beige_alerts']:
                     if x['id'] == entry['id']:
                         beige_button.disabled = True
@@ -619,8 +663,8 @@ class TargetFinding(commands.Cog):
             async def far_left_callback(self, b: discord.Button, i: discord.Interaction):
                 nonlocal cur_page
                 cur_page = 1
-                msg_embd = get_embed(best_targets[cur_page-1])
-                self.button_check(best_targets[cur_page-1])
+                msg_embd = page_embed(cur_page)
+                await self.button_check(best_targets[cur_page-1])
                 await i.response.edit_message(content="", embed=msg_embd, view=view)
 
             @discord.ui.button(label="<", style=discord.ButtonStyle.primary)
@@ -628,13 +672,13 @@ class TargetFinding(commands.Cog):
                 nonlocal cur_page
                 if cur_page > 1:
                     cur_page -= 1
-                    msg_embd = get_embed(best_targets[cur_page-1])
-                    self.button_check(best_targets[cur_page-1])
+                    msg_embd = page_embed(cur_page)
+                    await self.button_check(best_targets[cur_page-1])
                     await i.response.edit_message(content="", embed=msg_embd, view=view)
                 else:
                     cur_page = pages
-                    msg_embd = get_embed(best_targets[cur_page-1])
-                    self.button_check(best_targets[cur_page-1])
+                    msg_embd = page_embed(cur_page)
+                    await self.button_check(best_targets[cur_page-1])
                     await i.response.edit_message(content="", embed=msg_embd, view=view)
             
             @discord.ui.button(label=">", style=discord.ButtonStyle.primary)
@@ -642,21 +686,21 @@ class TargetFinding(commands.Cog):
                 nonlocal cur_page
                 if cur_page != pages:
                     cur_page += 1
-                    msg_embd = get_embed(best_targets[cur_page-1])
-                    self.button_check(best_targets[cur_page-1])
+                    msg_embd = page_embed(cur_page)
+                    await self.button_check(best_targets[cur_page-1])
                     await i.response.edit_message(content="", embed=msg_embd, view=view)
                 else:
                     cur_page = 1
-                    msg_embd = get_embed(best_targets[cur_page-1])
-                    self.button_check(best_targets[cur_page-1])
+                    msg_embd = page_embed(cur_page)
+                    await self.button_check(best_targets[cur_page-1])
                     await i.response.edit_message(content="", embed=msg_embd, view=view)
 
             @discord.ui.button(label=">>", style=discord.ButtonStyle.primary)
             async def far_right_callback(self, b: discord.Button, i: discord.Interaction):
                 nonlocal cur_page
                 cur_page = pages
-                msg_embd = get_embed(best_targets[cur_page-1])
-                self.button_check(best_targets[cur_page-1])
+                msg_embd = page_embed(cur_page)
+                await self.button_check(best_targets[cur_page-1])
                 await i.response.edit_message(content="", embed=msg_embd, view=view)
         
             if best_targets[0]['beigeturns'] > 0:
@@ -683,7 +727,7 @@ class TargetFinding(commands.Cog):
                     time += timedelta(hours=turns*2-1)
                 reminder['time'] = datetime(time.year, time.month, time.day, time.hour)
                 reminder['id'] = cur_embed['id']
-                user = mongo.global_users.find_one({"user": ctx.author.id})
+                user = await db.users.get(ctx.author.id)
                 if user == None:
                     await i.response.send_message(content=f"I didn't find you in the database! You better ping Randy I guess.", ephemeral=True)
                     return
@@ -693,7 +737,7 @@ class TargetFinding(commands.Cog):
                         await ctx.edit(view=view)
                         await i.response.send_message(content=f"You already have a beige reminder for this nation!", ephemeral=True)
                         return
-                mongo.global_users.find_one_and_update({"user": ctx.author.id}, {"$push": {"beige_alerts": reminder}})
+                await db.users.add_beige_alert(ctx.author.id, reminder)
                 beige_button.disabled = True
                 await ctx.edit(view=view)
                 await i.response.send_message(content=f"A beige reminder for <https://politicsandwar.com/nation/id={cur_embed['id']}> was added!", ephemeral=True)
@@ -714,7 +758,7 @@ class TargetFinding(commands.Cog):
         )
     async def reminders(self, ctx: discord.ApplicationContext):
         await ctx.defer()
-        person = mongo.global_users.find_one({"user": ctx.author.id})
+        person = await self.bot.db.users.get(ctx.author.id)
         if person == None:
             await ctx.respond(content=f"I didn't find you in the database! Make sure that you have verified your nation!")
             return
@@ -739,11 +783,11 @@ class TargetFinding(commands.Cog):
         nation: Option(str, "Nation name, nation link, discord username etc of the nation whose beige reminder you want to remove")
     ):
         await ctx.defer()
-        person = mongo.global_users.find_one({"user": ctx.author.id})
+        person = await self.bot.db.users.get(ctx.author.id)
         if person == None:
             await ctx.respond(content=f"I didn't find you in the database! Make sure that you have verified your nation!")
             return
-        parsed_nation = utils.find_nation(nation)
+        parsed_nation = await utils.find_nation(self.bot.db, nation)
         if parsed_nation == None:
             await ctx.respond("I could not find that nation!")
             return
@@ -756,7 +800,7 @@ class TargetFinding(commands.Cog):
                 alert_list = person['beige_alerts'].remove(alert)
                 if not alert_list:
                     alert_list = []
-                mongo.global_users.find_one_and_update({"user": person['user']}, {"$set": {"beige_alerts": alert_list}})
+                await self.bot.db.users.set_beige_alerts(person['user'], alert_list)
                 found = True
         if not found:
             await ctx.respond(content="I did not find a reminder for that nation!")
@@ -773,11 +817,11 @@ class TargetFinding(commands.Cog):
         arg: Option(str, "Nation name, nation link, discord username etc of the nation you want to add a beige reminder for")
     ):
         await ctx.defer()
-        nation = utils.find_nation(arg)
+        nation = await utils.find_nation(self.bot.db, arg)
         if nation == None:
             await ctx.respond(content='I could not find that nation!')
             return
-        res = requests.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{nations(first:1 id:{nation['id']}){{data{{beigeturns}}}}}}"}).json()['data']['nations']['data'][0]
+        res = (await self.bot.pnw.query(queries.nations(queries.BEIGE, first=1, id=nation['id']), "addreminder"))['data']['nations']['data'][0]
         if res['beigeturns'] == 0:
             await ctx.respond(content="They are not beige!")
             return
@@ -790,7 +834,7 @@ class TargetFinding(commands.Cog):
             time += timedelta(hours=turns*2-1)
         reminder['time'] = datetime(time.year, time.month, time.day, time.hour)
         reminder['id'] = nation['id']
-        user = mongo.global_users.find_one({"user": ctx.author.id})
+        user = await self.bot.db.users.get(ctx.author.id)
         if user == None:
             await ctx.respond(content=f"I didn't find you in the database! Make sure that you have verified your nation!")
             return
@@ -798,7 +842,7 @@ class TargetFinding(commands.Cog):
             if reminder['id'] == entry['id']:
                 await ctx.respond(content=f"You already have a beige reminder for this nation!")
                 return
-        mongo.global_users.find_one_and_update({"user": ctx.author.id}, {"$push": {"beige_alerts": reminder}})
+        await self.bot.db.users.add_beige_alert(ctx.author.id, reminder)
         await ctx.respond(content=f"A beige reminder for https://politicsandwar.com/nation/id={nation['id']} was added.")
 
     @slash_command(
@@ -814,7 +858,7 @@ class TargetFinding(commands.Cog):
         await ctx.defer()
         if nation1 == None:
             nation1 = ctx.author.id
-        nation1_nation = utils.find_nation_plus(self, nation1)
+        nation1_nation = await utils.find_nation_plus(self.bot.db, self, nation1)
         if not nation1_nation:
             if nation2 == None:
                 await ctx.respond(content='I could not find that nation!')
@@ -826,7 +870,7 @@ class TargetFinding(commands.Cog):
 
         if nation2 == None:
             nation2 = ctx.author.id
-        nation2_nation = utils.find_nation_plus(self, nation2)
+        nation2_nation = await utils.find_nation_plus(self.bot.db, self, nation2)
         if not nation2_nation:
             if nation2 == None:
                 await ctx.respond(content='I was able to find the nation you linked, but I could not find *your* nation!')
@@ -910,7 +954,7 @@ class TargetFinding(commands.Cog):
         await ctx.defer()
         if nation1 == None:
             nation1 = ctx.author.id
-        nation1_nation = utils.find_nation_plus(self, nation1)
+        nation1_nation = await utils.find_nation_plus(self.bot.db, self, nation1)
         if not nation1_nation:
             if nation2 == None:
                 await ctx.respond(content='I could not find that nation!')
@@ -922,7 +966,7 @@ class TargetFinding(commands.Cog):
 
         if nation2 == None:
             nation2 = ctx.author.id
-        nation2_nation = utils.find_nation_plus(self, nation2)
+        nation2_nation = await utils.find_nation_plus(self.bot.db, self, nation2)
         if not nation2_nation:
             if nation2 == None:
 
@@ -949,11 +993,9 @@ class TargetFinding(commands.Cog):
     async def battle_calc(self, nation1_id, nation2_id):
         results = {}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{nations(first:1 id:{nation1_id}){{data{{nation_name population warpolicy id soldiers tanks aircraft ships irond vds cities{{infrastructure land}} wars{{groundcontrol airsuperiority navalblockade attpeace defpeace attid defid att_fortify def_fortify turnsleft war_type}}}}}}}}"}) as temp:
-                results['nation1'] = (await temp.json())['data']['nations']['data'][0]
-            async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{nations(first:1 id:{nation2_id}){{data{{nation_name population warpolicy id soldiers tanks aircraft ships irond vds cities{{infrastructure land}}}}}}}}"}) as temp:
-                results['nation2'] = (await temp.json())['data']['nations']['data'][0]
+        nations = await self.bot.pnw.fetch_nations([nation1_id, nation2_id], queries.BATTLE + queries.WARS_STATUS, "battle_calc")
+        results['nation1'] = nations[str(nation1_id)]
+        results['nation2'] = nations[str(nation2_id)]
 
         results['nation1_append'] = ""
         results['nation2_append'] = ""
@@ -0,0 +1,98 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+import pymongo
+from pymongo.collection import Collection
+from pymongo.database import Database as MongoDatabase
+
+CASE_INSENSITIVE = {"locale": "en", "strength": 1}
+
+def create_client(uri: str, *, max_pool_size: int = 20, max_idle: float = 60, connect_timeout: float = 10, timeout: float = 30, read_preference: str = "primaryPreferred", compressors: str = "zlib") -> pymongo.MongoClient:
+    """
+    Creates the bot's MongoDB client. There should only be one per process, since every client has its own connection pool and monitoring threads.
+    :param max_pool_size: The maximum number of connections to the database. Idle connections are closed after `max_idle` seconds.
+    :param connect_timeout: Seconds before connecting to or selecting a server fails.
+    :param timeout: Seconds before a single database call fails.
+    :param read_preference: Where reads are sent, for example `primary` or `secondaryPreferred`.
+    :param compressors: Comma separated wire compressors to offer the server. `zlib` needs no extra packages.
+    """
+    return pymongo.MongoClient(
+        uri,
+        maxPoolSize=max_pool_size,
+        maxIdleTimeMS=int(max_idle * 1000),
+        connectTimeoutMS=int(connect_timeout * 1000),
+        serverSelectionTimeoutMS=int(connect_timeout * 1000),
+        socketTimeoutMS=int(timeout * 1000),
+        readPreference=read_preference,
+        compressors=compressors,
+        appname="Autolycus",
+    )
+
+class Database:
+    """
+    Awaitable access to the bot's MongoDB database. pymongo is blocking, so every call is run in a dedicated thread pool instead of on the event loop. `workers` is the number of database calls that can be in flight at once; any more wait for a free worker.
+    """
+
+    def __init__(self, database: MongoDatabase, workers: int = 8):
+        self.database = database
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mongo")
+        self.users = UserRepository(self, database.global_users)
+        self.nations = NationRepository(self, database.world_nations)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a blocking function in the database thread pool and waits for the result.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+class UserRepository:
+    """
+    The `global_users` collection, which links discord users to nations and holds their beige reminders.
+    """
+
+    def __init__(self, db: Database, collection: Collection):
+        self.db = db
+        self.collection = collection
+
+    async def get(self, user_id: int) -> Union[dict, None]:
+        return await self.db.run(self.collection.find_one, {"user": int(user_id)})
+
+    async def get_by_nation(self, nation_id: Union[str, int]) -> Union[dict, None]:
+        return await self.db.run(self.collection.find_one, {"id": str(nation_id)})
+
+    async def all(self) -> list:
+        return await self.db.run(lambda: list(self.collection.find({})))
+
+    async def with_beige_alerts(self) -> list:
+        return await self.db.run(lambda: list(self.collection.find({"beige_alerts": {"$exists": True, "$not": {"$size": 0}}})))
+
+    async def add(self, user_id: int, nation_id: Union[str, int]) -> None:
+        await self.db.run(self.collection.insert_one, {"user": int(user_id), "id": str(nation_id), "beige_alerts": []})
+
+    async def remove(self, user_id: int) -> Union[dict, None]:
+        return await self.db.run(self.collection.find_one_and_delete, {"user": int(user_id)})
+
+    async def add_beige_alert(self, user_id: int, reminder: dict) -> None:
+        await self.db.run(self.collection.find_one_and_update, {"user": int(user_id)}, {"$push": {"beige_alerts": reminder}})
+
+    async def set_beige_alerts(self, user_id: int, alerts: list) -> None:
+        await self.db.run(self.collection.find_one_and_update, {"user": int(user_id)}, {"$set": {"beige_alerts": alerts}})
+
+class NationRepository:
+    """
+    The `world_nations` collection, a copy of every nation's id, names and discord username.
+    """
+
+    def __init__(self, db: Database, collection: Collection):
+        self.db = db
+        self.collection = collection
+
+    async def find_one(self, field: str, value: str) -> Union[dict, None]:
+        """
+        Returns the first nation whose `field` matches `value`, ignoring case.
+        """
+        return await self.db.run(lambda: next(iter(self.collection.find({field: value}).collation(CASE_INSENSITIVE).limit(1)), None))
@@ -1,30 +1,49 @@
-import asyncio
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import keep_alive
-import pymongo
-import aiohttp
 import os
 from discord.commands import Option
 from discord.bot import ApplicationCommandMixin
 import re
-from threading import Thread
-import json
 import math
 import pathlib
 import utils
+import api
+import db
+import queries
+import scanner
+import store
+import supervisor
+import modifiers
+import raidcache
 import time
 import discord
 from discord.ext import commands
 load_dotenv()
 
-client = pymongo.MongoClient(os.getenv("pymongolink"))
 version = os.getenv("version")
-mongo = client[str(version)]
 api_key = os.getenv("api_key")
 channel_id = int(os.getenv("debug_channel"))
 
-bot = commands.Bot()
+class Autolycus(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the one database client of the bot, every cog uses it through `bot.db`
+        self.mongo = db.create_client(os.getenv("pymongolink"), max_pool_size=int(os.getenv("mongo_pool_size", 20)), timeout=float(os.getenv("mongo_timeout", 30)), read_preference=os.getenv("mongo_read_preference", "primaryPreferred"), compressors=os.getenv("mongo_compressors", "zlib"))
+        self.db = db.Database(self.mongo[str(version)], workers=int(os.getenv("mongo_workers", 8)))
+
+    async def close(self):
+        self.supervisor.stop()
+        await self.pnw.close()
+        self.db.close()
+        self.mongo.close()
+        self.store.close()
+        await super().close()
+
+bot = Autolycus()
+bot.pnw = api.PnWClient(api_key, limit_per_host=int(os.getenv("api_connections", 30)), timeout=float(os.getenv("api_timeout", 60)), reuse_window=float(os.getenv("api_reuse_window", 5)), rate=float(os.getenv("api_rate", 10)))
+bot.store = store.NationStore(pathlib.Path.cwd() / 'nations.db')
+bot.scanner = scanner.NationScanner(bot.pnw, bot.store, interval=float(os.getenv("scanner_interval", 300)), full_interval=float(os.getenv("scanner_full_interval", 21600)), full_fraction=float(os.getenv("scanner_full_fraction", 0.5)), concurrency=int(os.getenv("scanner_concurrency", 4)), snapshot_path=pathlib.Path.cwd() / 'nations.snapshot')
 
 for filename in os.listdir('./cogs'):
     if filename.endswith('.py'):
@@ -62,6 +81,30 @@ async def on_application_command_error(ctx: discord.ApplicationContext, error):
 async def ping(ctx: discord.ApplicationContext):
     await ctx.respond(f'Pong! {round(bot.latency * 1000)}ms')
 
+@bot.slash_command(name="status", description="See how the background tasks are doing")
+async def status(ctx: discord.ApplicationContext):
+    embed = discord.Embed(title="Status", color=0xff5100)
+    for job in bot.supervisor.jobs.values():
+        if job.last_success:
+            job_info = f"> Status: {'Failing' if job.failing else 'OK'}\n> Last success: <t:{round(job.last_success)}:R>\n> Cycle duration: `{job.cycle_duration:,.1f}s`"
+        else:
+            job_info = f"> Status: {'Failing' if job.failing else 'Starting'}\n> Last success: Never"
+        job_info += f"\n> Runs: `{job.runs:,}`\n> Failures: `{job.failures:,}`"
+        if job.failing:
+            job_info += f"\n> Last error: `{job.last_error}`"
+        embed.add_field(name=job.name, value=job_info, inline=False)
+
+    if bot.scanner.last_fetched:
+        data_info = f"> Last cached: <t:{bot.scanner.last_fetched}:R>\n> Data age: `{(time.time() - bot.scanner.last_fetched) / 60:,.0f}` minutes"
+    else:
+        data_info = "> Last cached: Never"
+    data_info += f"\n> Nations: `{len(bot.scanner.nations):,}`\n> Last cycle: `{bot.scanner.cycle_time:,.0f}s`, `{bot.scanner.pages:,}` pages, `{bot.scanner.pages_per_second:,.1f}` pages/s, `{bot.scanner.failures:,}` failed"
+    if modifiers.cache.fetched:
+        data_info += f"\n> Income modifiers: fetched <t:{round(modifiers.cache.fetched)}:R>"
+    embed.add_field(name="Nation Data", value=data_info, inline=False)
+    embed.add_field(name="Raid Cache", value=f"> Hit rate: `{raidcache.cache.hit_rate:.0%}` (`{raidcache.cache.hits:,}` hits, `{raidcache.cache.misses:,}` misses)\n> Cached brackets: `{len(raidcache.cache):,}`", inline=False)
+    await ctx.respond(embed=embed)
+
 @bot.slash_command(
     name="who",
     description="Get more information about someone's nation",
@@ -73,17 +116,15 @@ async def who(
     await ctx.defer()
     if person == None:
         person = ctx.author.id
-    nation = utils.find_nation_plus(bot, person)
+    nation = await utils.find_nation_plus(bot.db, bot, person)
     if nation == None:
         await ctx.respond(content="I did not find that nation!")
         return
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={"query": f"{{nations(first:1 id:{nation['id']}){{data{{id nation_name discord leader_name num_cities cia spy_satellite warpolicy population dompolicy flag vmode color beigeturns last_active soldiers tanks aircraft ships nukes missiles mlp nrf vds irond wars{{attid turnsleft}} cities{{barracks factory airforcebase drydock}} score alliance_position alliance_seniority alliance{{name id score color nations{{id}}}}}}}}}}"}) as temp:
-            nation = (await temp.json())['data']['nations']['data'][0]
+    nation = (await bot.pnw.fetch_nations([nation['id']], queries.WHO, "who"))[nation['id']]
 
     embed = discord.Embed(title=nation['nation_name'], url=f"https://politicsandwar.com/nation/id={nation['id']}", color=0xff5100)
-    user = utils.find_user(bot, nation['id'])
+    user = await utils.find_user(bot.db, bot, nation['id'])
     if not user:
         discord_info = "> Verified: <:redcross:862669500977905694>"
         if nation['discord']:
@@ -105,7 +146,7 @@ async def who(
         alliance_info = f"> Alliance: None"
     embed.add_field(name="Alliance Info", value=alliance_info, inline=False)
 
-    spy_count = await utils.spy_calc(nation)
+    spy_count = await utils.spy_calc(bot.pnw, nation)
     if nation['spy_satellite']:
         daily_rebuy = 3
     else:
@@ -160,22 +201,20 @@ async def verify(
     ctx: discord.ApplicationContext,
     nation_id: Option(str, "Your nation id or nation link"),
 ):
-    user = mongo.global_users.find_one({"user": ctx.author.id})
+    user = await bot.db.users.get(ctx.author.id)
     if user != None:
         await ctx.respond("You are already verified!")
         return
     nation_id = re.sub("[^0-9]", "", nation_id)
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f'{{nations(first:1 id:{nation_id}){{data{{id nation_name leader_name discord}}}}}}'}) as temp:
-            res = await temp.json()
-            try:
-                if res['data']['nations']['data'][0]['discord'] == str(ctx.author):
-                    mongo.global_users.insert_one({"user": ctx.author.id, "id": nation_id, "beige_alerts": []})
-                    await ctx.respond("You have successfully verified your nation!")
-                else:
-                    await ctx.respond(f'1. Got to https://politicsandwar.com/nation/edit/\n2. Scroll down to where it says "Discord Username"\n3. Type `{ctx.author}` in the adjacent field.\n4. Come back to discord\n5. Write `/verify {nation_id}` again.')
-            except KeyError:
-                await ctx.respond(f"I could not find a nation with an id of `{nation_id}`")
+    res = await bot.pnw.fetch_nations([nation_id], queries.VERIFY, "verify")
+    try:
+        if res[nation_id]['discord'] == str(ctx.author):
+            await bot.db.users.add(ctx.author.id, nation_id)
+            await ctx.respond("You have successfully verified your nation!")
+        else:
+            await ctx.respond(f'1. Got to https://politicsandwar.com/nation/edit/\n2. Scroll down to where it says "Discord Username"\n3. Type `{ctx.author}` in the adjacent field.\n4. Come back to discord\n5. Write `/verify {nation_id}` again.')
+    except KeyError:
+        await ctx.respond(f"I could not find a nation with an id of `{nation_id}`")
 
 @bot.slash_command(
     name="unverify",
@@ -184,7 +223,7 @@ async def verify(
 async def unverify(
     ctx: discord.ApplicationContext,
 ):
-    user = mongo.global_users.find_one_and_delete({"user": ctx.author.id})
+    user = await bot.db.users.remove(ctx.author.id)
     if user == None:
         await ctx.respond("You are not verified!")
         return
@@ -192,63 +231,47 @@ async def unverify(
         await ctx.respond("Your discord account was successfully unlinked from your nation.")
 
 async def alert_scanner():
-    await bot.wait_until_ready()
     debug_channel = bot.get_channel(channel_id)
-    while True:
-        minute = 50
-        now = datetime.utcnow()
-        future = datetime(now.year, now.month, now.day, now.hour, minute)
-        if now.minute >= minute:
-            future += timedelta(hours=1, seconds=1)
-        await asyncio.sleep((future-now).seconds)
-        try:
-            alerts = list(mongo.global_users.find({"beige_alerts": {"$exists": True, "$not": {"$size": 0}}}))
-            for user in alerts:
-                for alert in user['beige_alerts']:
-                    if datetime.utcnow() >= alert['time'] - timedelta(minutes=10):
-                        disc_user = await bot.fetch_user(user['user'])
-                        try:
-                            await disc_user.send(f"Hey, https://politicsandwar.com/nation/id={alert['id']} is leaving beige <t:{round(alert['time'].timestamp())}:R>!")
-                        except:
-                            await debug_channel.send(f"**Silly person**\nI was attempting to DM {disc_user} about a beige reminder, but I was unable to message them.")
-                        user['beige_alerts'].remove(alert)
-                        alert_list = user['beige_alerts']
-                        if not alert_list:
-                            alert_list = []
-                        mongo.global_users.find_one_and_update({"user": user['user']}, {"$set": {"beige_alerts": alert_list}})
-        except Exception as error:
-            await debug_channel.send(f'**Exception raised!**\nWhere: Scanning beige alerts\n\nError:```{error}```')
+    alerts = await bot.db.users.with_beige_alerts()
+    for user in alerts:
+        for alert in user['beige_alerts']:
+            if datetime.utcnow() >= alert['time'] - timedelta(minutes=10):
+                disc_user = await bot.fetch_user(user['user'])
+                try:
+                    await disc_user.send(f"Hey, https://politicsandwar.com/nation/id={alert['id']} is leaving beige <t:{round(alert['time'].timestamp())}:R>!")
+                except:
+                    await debug_channel.send(f"**Silly person**\nI was attempting to DM {disc_user} about a beige reminder, but I was unable to message them.")
+                user['beige_alerts'].remove(alert)
+                alert_list = user['beige_alerts']
+                if not alert_list:
+                    alert_list = []
+                await bot.db.users.set_beige_alerts(user['user'], alert_list)
+
+def until_alerts():
+    minute = 50
+    now = datetime.utcnow()
+    future = datetime(now.year, now.month, now.day, now.hour, minute)
+    if now.minute >= minute:
+        future += timedelta(hours=1, seconds=1)
+    return (future-now).seconds
 
 async def nation_scanner():
+    if bot.scanner.index is None:
+        await bot.scanner.load()
+    await bot.scanner.cycle()
+
+async def report_error(job, error):
     await bot.wait_until_ready()
     debug_channel = bot.get_channel(channel_id)
-    while True:
-        try:
-            async with aiohttp.ClientSession() as session:
-                more_pages = True
-                n = 1
-                first = 50
-                new_nations = {"last_fetched": None, "nations": []}
-                while more_pages:
-                    try:
-                        await asyncio.sleep(2)
-                        async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{nations(page:{n} first:{first} vmode:false orderBy:{{column:DATE order:ASC}}){{paginatorInfo{{hasMorePages}} data{{id discord leader_name nation_name flag last_active continent dompolicy population alliance_id beigeturns score color soldiers tanks aircraft ships missiles nukes bounties{{amount war_type}} treasures{{name}} alliance{{name}} wars{{date winner defid turnsleft attacks{{loot_info victor moneystolen}}}} alliance_position num_cities ironw bauxitew armss egr massirr itc recycling_initiative telecom_satellite green_tech clinical_research_center specialized_police_training uap cities{{date powered infrastructure land oilpower windpower coalpower nuclearpower coalmine oilwell uramine barracks farm policestation hospital recyclingcenter subway supermarket bank mall stadium leadmine ironmine bauxitemine gasrefinery aluminumrefinery steelmill munitionsfactory factory airforcebase drydock}}}}}}}}"}) as temp:
-                            resp = await temp.json()
-                            new_nations['nations'] += resp['data']['nations']['data']
-                            more_pages = resp['data']['nations']['paginatorInfo']['hasMorePages']
-                    except (aiohttp.client_exceptions.ContentTypeError, TypeError) as e:
-                        print("error: ", str(type(e)))
-                        continue
-                    n += 1
-                new_nations['last_fetched'] = round(datetime.utcnow().timestamp())
-                with open(pathlib.Path.cwd() / 'nations.json', 'w') as json_file:
-                    json.dump(new_nations, json_file)
-        except Exception as error:
-            await debug_channel.send(f'**Exception raised!**\nWhere: Scanning nations\n\nError:```{error}```')
+    await debug_channel.send(f'**Exception raised!**\nWhere: {job.name}\n\nError:```{error}```')
+
+bot.supervisor = supervisor.Supervisor(report_error)
+bot.supervisor.add("Scanning beige alerts", alert_scanner, until_alerts, wait=bot.wait_until_ready)
+bot.supervisor.add("Scanning nations", nation_scanner, bot.scanner.interval, wait=bot.wait_until_ready)
+bot.supervisor.add("Refreshing income modifiers", lambda: modifiers.cache.refresh(bot.pnw), lambda: (modifiers.next_turn() - datetime.utcnow()).total_seconds() + 60)
 
 keep_alive.run()
 
-bot.run(os.getenv("bot_token"))
+bot.supervisor.start(bot.loop)
 
-Thread(target=asyncio.run, args=(nation_scanner(),)).start()
-Thread(target=asyncio.run, args=(alert_scanner(),)).start()
\ No newline at end of file
+bot.run(os.getenv("bot_token"))
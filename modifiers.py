@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Union
+import queries
+
+TURN_HOURS = 2
+
+def next_turn(now: datetime = None) -> datetime:
+    """
+    Returns when the next game turn starts. Turns change every other hour on the hour, UTC.
+    """
+    now = now or datetime.utcnow()
+    turn = datetime(now.year, now.month, now.day, now.hour - now.hour % TURN_HOURS)
+    return turn + timedelta(hours=TURN_HOURS)
+
+def parse(res: dict) -> tuple:
+    """
+    Turns the response of `queries.MODIFIERS` into `(colors, prices, treasures, radiation, seasonal_mod)`, as used by `utils.revenue_calc`.
+    """
+    res_colors = res['data']['colors']
+    colors = {}
+    for color in res_colors:
+        colors[color['color']] = color['turn_bonus'] * 12
+
+    prices = res['data']['tradeprices']['data'][0]
+    prices['money'] = 1
+
+    treasures = res['data']['treasures']
+
+    game_info = res['data']['game_info']
+
+    rad = game_info['radiation']
+    radiation = {"na": 1 - (rad['north_america'] + rad['global'])/1000, "sa": 1 - (rad['south_america'] + rad['global'])/1000, "eu": (rad['europe'] + rad['global'])/1000, "as": 1 - (rad['asia'] + rad['global'])/1000, "af": 1 - (rad['africa'] + rad['global'])/1000, "au": 1 - (rad['australia'] + rad['global'])/1000, "an": 1 - (rad['antarctica'] + rad['global'])/1000}
+
+    month = int(game_info['game_date'][5:7])
+    seasonal_mod = {"na": 1, "sa": 1, "eu": 1, "as": 1, "af": 1, "au": 1, "an": 0.5}
+    if month in [6,7,8]:
+        seasonal_mod['na'] = 1.2
+        seasonal_mod['as'] = 1.2
+        seasonal_mod['eu'] = 1.2
+        seasonal_mod['sa'] = 0.8
+        seasonal_mod['af'] = 0.8
+        seasonal_mod['au'] = 0.8
+    elif month in [12,1,2]:
+        seasonal_mod['na'] = 0.8
+        seasonal_mod['as'] = 0.8
+        seasonal_mod['eu'] = 0.8
+        seasonal_mod['sa'] = 1.2
+        seasonal_mod['af'] = 1.2
+        seasonal_mod['au'] = 1.2
+
+    return colors, prices, treasures, radiation, seasonal_mod
+
+class ModifierCache:
+    """
+    The game-wide income modifiers (colors, prices, treasures, radiation and seasons). They only change when the turn does, so they are fetched once per turn and kept until the next turn starts. The parsed tuple is shared, so it must not be modified.
+
+    `version` goes up every time new modifiers are stored, so that anything computed from them can tell when it is outdated.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.expires = datetime.min
+        self.fetched = None
+        self.version = 0
+        self._refreshing = None
+
+    @property
+    def fresh(self) -> bool:
+        return self.value is not None and datetime.utcnow() < self.expires
+
+    def get(self) -> Union[tuple, None]:
+        """
+        Returns the cached modifiers without waiting, even if they are from the previous turn. None if they were never fetched.
+        """
+        return self.value
+
+    def store(self, value: tuple) -> None:
+        self.value = value
+        self.expires = next_turn()
+        self.fetched = time.time()
+        self.version += 1
+
+    async def _fetch(self, pnw) -> tuple:
+        try:
+            # fetched uncoalesced, so that a refresh right after turn change doesn't get last turn's response
+            self.store(parse(await pnw.query(queries.MODIFIERS, "revenue_modifiers", share=False)))
+            return self.value
+        finally:
+            self._refreshing = None
+
+    async def refresh(self, pnw) -> tuple:
+        """
+        Fetches the modifiers again. If a refresh is already running, that one is waited for instead.
+        """
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._fetch(pnw))
+        return await asyncio.shield(self._refreshing)
+
+    async def load(self, pnw) -> tuple:
+        """
+        Returns the modifiers of the current turn, fetching them if the cached ones are outdated.
+        """
+        if self.fresh:
+            return self.value
+        return await self.refresh(pnw)
+
+cache = ModifierCache()
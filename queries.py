@@ -0,0 +1,84 @@
+from typing import Union
+
+class Fragment:
+    """
+    A reusable GraphQL selection set. Fragments can be combined with `+`, which merges their fields, nested selections included.
+    """
+
+    def __init__(self, *fields: str, **nested: "Fragment"):
+        self.fields = tuple(dict.fromkeys(fields))
+        self.nested = nested
+
+    def __add__(self, other: "Fragment") -> "Fragment":
+        nested = dict(self.nested)
+        for name, fragment in other.nested.items():
+            nested[name] = nested[name] + fragment if name in nested else fragment
+        return Fragment(*self.fields, *other.fields, **nested)
+
+    def __str__(self) -> str:
+        parts = list(self.fields)
+        for name, fragment in self.nested.items():
+            parts.append(f"{name}{{{fragment}}}")
+        return " ".join(parts)
+
+    def __repr__(self) -> str:
+        return f"Fragment({self})"
+
+def _arg(value) -> str:
+    # strings are inserted verbatim, so that enums like DATE can be passed as-is
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (list, tuple, set)):
+        return f"[{','.join(_arg(v) for v in value)}]"
+    if isinstance(value, dict):
+        return f"{{{' '.join(f'{k}:{_arg(v)}' for k, v in value.items())}}}"
+    return str(value)
+
+def arguments(**args) -> str:
+    """
+    Formats keyword arguments as GraphQL arguments. Arguments that are None are left out.
+    """
+    return " ".join(f"{key}:{_arg(value)}" for key, value in args.items() if value is not None)
+
+def nations(fields: Union[Fragment, None], *, paginator: Union[Fragment, None] = None, **args) -> str:
+    """
+    Builds a `nations` query.
+    :param fields: The fields to select for every nation. If None, only `paginator` is selected.
+    :param paginator: The `paginatorInfo` fields to select, if any.
+    :param args: The arguments for `nations`, for example `page`, `first`, `id`, `min_score` or `vmode`.
+    :return: The query.
+    """
+    selection = []
+    if paginator is not None:
+        selection.append(f"paginatorInfo{{{paginator}}}")
+    if fields is not None:
+        selection.append(f"data{{{fields}}}")
+    return f"{{nations({arguments(**args)}){{{' '.join(selection)}}}}}"
+
+LAST_PAGE = Fragment("lastPage")
+HAS_MORE_PAGES = Fragment("hasMorePages")
+
+NATION_CORE = Fragment("id", "nation_name", "leader_name", "alliance_id", "alliance_position", "color", "score", "num_cities", "last_active", "beigeturns", "continent", "dompolicy")
+NATION_MILITARY = Fragment("population", "soldiers", "tanks", "aircraft", "ships", "missiles", "nukes")
+PROJECTS_ECONOMY = Fragment("ironw", "bauxitew", "armss", "egr", "massirr", "itc", "recycling_initiative", "telecom_satellite", "green_tech", "clinical_research_center", "specialized_police_training", "uap")
+CITIES_ECONOMY = Fragment(cities=Fragment("date", "powered", "infrastructure", "land", "oilpower", "windpower", "coalpower", "nuclearpower", "coalmine", "oilwell", "uramine", "farm", "policestation", "hospital", "recyclingcenter", "subway", "supermarket", "bank", "mall", "stadium", "leadmine", "ironmine", "bauxitemine", "gasrefinery", "aluminumrefinery", "steelmill", "munitionsfactory"))
+CITIES_MILITARY = Fragment(cities=Fragment("barracks", "factory", "airforcebase", "drydock"))
+WARS_ACTIVE = Fragment(wars=Fragment("attid", "defid", "turnsleft"))
+WARS_WITH_LOOT = Fragment(wars=Fragment("date", "winner", "defid", "turnsleft", attacks=Fragment("loot_info", "victor")))
+WARS_STATUS = Fragment(wars=Fragment("groundcontrol", "airsuperiority", "navalblockade", "attpeace", "defpeace", "attid", "defid", "att_fortify", "def_fortify", "turnsleft", "war_type"))
+
+# what the nation scanner compares to find nations that changed since they were last fetched
+NATION_FINGERPRINT = Fragment("id", "last_active", "score", "color", "alliance_id", "beigeturns", "soldiers", "tanks", "aircraft", "ships", "missiles", "nukes", "offensive_wars_count", "defensive_wars_count")
+
+# what revenue_calc reads
+REVENUE = NATION_CORE + NATION_MILITARY + PROJECTS_ECONOMY + CITIES_ECONOMY + Fragment("alliance_id", alliance=Fragment("name")) + Fragment(wars=Fragment("turnsleft"))
+
+# per command field sets
+RAIDS_ATTACKER = Fragment("id", "nation_name", "score", "population", "soldiers", "tanks", "aircraft", "ships")
+RAIDS_TARGET = REVENUE + WARS_WITH_LOOT + Fragment(treasures=Fragment("name")) + NATION_FINGERPRINT
+WHO = Fragment("id", "nation_name", "discord", "leader_name", "num_cities", "cia", "spy_satellite", "warpolicy", "population", "dompolicy", "flag", "vmode", "color", "beigeturns", "soldiers", "tanks", "aircraft", "ships", "nukes", "missiles", "mlp", "nrf", "vds", "irond", "score", "alliance_position", "alliance_seniority", alliance=Fragment("name", "id", "score", "color", nations=Fragment("id"))) + WARS_ACTIVE + CITIES_MILITARY
+VERIFY = Fragment("id", "nation_name", "leader_name", "discord")
+BUILDS = Fragment("id", "continent", "date", "color", "dompolicy", "alliance_id", "num_cities", alliance=Fragment("name")) + PROJECTS_ECONOMY
+BATTLE = Fragment("id", "nation_name", "population", "warpolicy", "soldiers", "tanks", "aircraft", "ships", "irond", "vds", cities=Fragment("infrastructure", "land"))
+BEIGE = Fragment("beigeturns")
+MODIFIERS = "{colors{color turn_bonus} game_info{game_date radiation{global north_america south_america africa europe asia australia antarctica}} tradeprices(page:1 first:1){data{coal oil uranium iron bauxite lead gasoline munitions steel aluminum food}} treasures{bonus nation{id alliance_id}}}"
@@ -0,0 +1,67 @@
+import asyncio
+import math
+from datetime import datetime
+from typing import Awaitable, Callable
+import modifiers
+
+class RaidCache:
+    """
+    The candidates of `/raids` from the cached nation data, filtered by everything that doesn't depend on the attacker's exact score. They are shared by every user whose score falls in the same bracket of `bracket` score points and who picked the same filters. Users only filter them down to their own score range, and work out and score the targets that can make it into their results.
+
+    Every entry belongs to a generation of the nation data, like the time it was fetched, and is kept until the turn changes or newer data is published, whichever comes first. Candidates must not be modified, copy them first.
+    """
+
+    def __init__(self, bracket: float = 100):
+        self.bracket = bracket
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._building = {}
+
+    def window(self, score: float) -> tuple:
+        """
+        The score range of the bracket `score` is in. It contains the range of every attacker in the bracket.
+        """
+        bracket = math.floor(score / self.bracket)
+        return math.floor(bracket * self.bracket * 0.75) - 1, math.ceil((bracket + 1) * self.bracket * 1.75) + 1
+
+    def key(self, score: float, **filters) -> tuple:
+        return (math.floor(score / self.bracket),) + tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in filters.items()))
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def _build(self, key: tuple, build: Callable[[], Awaitable[list]]) -> list:
+        try:
+            candidates = await build()
+            now = datetime.utcnow()
+            newest = max([generation for generation, *_ in self._entries] + [key[0]])
+            self._entries = {old: entry for old, entry in self._entries.items() if entry[0] > now and old[0] == newest}
+            # a build that was overtaken by newer data is handed to whoever waited for it, but not kept
+            if key[0] == newest:
+                self._entries[key] = (modifiers.next_turn(), candidates)
+            return candidates
+        finally:
+            del self._building[key]
+
+    async def get(self, key: tuple, build: Callable[[], Awaitable[list]], generation: float) -> list:
+        """
+        Returns the candidates for `key`, or makes them with `build` if they are missing, from a previous turn or from older data than `generation`. If they are already being made for someone else, that is waited for instead.
+        """
+        key = (generation,) + key
+        entry = self._entries.get(key)
+        if entry is not None and datetime.utcnow() < entry[0]:
+            self.hits += 1
+            return entry[1]
+        if key in self._building:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._building[key] = asyncio.ensure_future(self._build(key, build))
+        return await asyncio.shield(self._building[key])
+
+cache = RaidCache()
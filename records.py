@@ -0,0 +1,250 @@
+import json
+import operator
+import re
+import zlib
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, Union
+import queries
+
+# the fields of the nations in the scanner's snapshot, taken from the query so that the two can't drift apart
+PROJECTS = queries.PROJECTS_ECONOMY.fields
+SCALARS = tuple(field for field in queries.RAIDS_TARGET.fields if field not in PROJECTS)
+CITY_COUNTS = tuple(field for field in queries.RAIDS_TARGET.nested['cities'].fields if field not in ("date", "powered", "infrastructure", "land"))
+
+# ids are kept as ints and dates as timestamps, and turned back into the strings of the API by `to_dict`
+ID_FIELDS = ("id", "alliance_id")
+TIME_FIELDS = ("last_active",)
+NEVER = "-0001-11-30 00:00:00"
+
+# the resources in the order they appear in loot, which is also the order of loot vectors
+RESOURCES = ("money", "coal", "oil", "uranium", "iron", "bauxite", "lead", "gasoline", "munitions", "steel", "aluminum", "food")
+LOOT_AMOUNT = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+def parse_time(text: str) -> Union[float, None]:
+    """
+    Turns a date of the API into a timestamp. None for dates like `-0001-11-30 00:00:00`, which mean never.
+    """
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def format_time(timestamp: Union[float, None]) -> str:
+    if timestamp is None:
+        return NEVER
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S") + "+00:00"
+
+def parse_loot(text: Union[str, None]) -> Union[array, None]:
+    """
+    Turns the loot info of the attack that won a war into a vector of the looted amounts, in the order of RESOURCES. None if the attack didn't end a war with loot.
+
+    >>> parse_loot("Ghost Recon won the war and looted 2,311,947 Money, 1,049 Coal, 1,530 Oil, 61 Uranium, 1,733 Iron, 1,690 Bauxite, 1,277 Lead, 2,096 Gasoline, 2,466 Munitions, 1,814 Steel, 1,119 Aluminum, and 55,873 Food. \\r\\nGhost Recon also destroyed 12.50 infrastructure.").tolist()
+    [2311947.0, 1049.0, 1530.0, 61.0, 1733.0, 1690.0, 1277.0, 2096.0, 2466.0, 1814.0, 1119.0, 55873.0]
+    >>> parse_loot("Ghost Recon won the war and looted $311,947.25, 0.00 Coal, 0.00 Oil, 0.00 Uranium, 0.00 Iron, 0.00 Bauxite, 0.00 Lead, 10.50 Gasoline, 0.00 Munitions, 0.00 Steel, 0.00 Aluminum, and 1,000.00 Food. ")[:2].tolist()
+    [311947.25, 0.0]
+    >>> parse_loot("Ghost Recon won the war and looted 10.00% of Dauntless's resources! They looted $5.00, 1.00 Coal, 0 Oil, 0 Uranium, 0 Iron, 0 Bauxite, 0 Lead, 0 Gasoline, 0 Munitions, 0 Steel, 0 Aluminum, and 2.00 Food.")[:2].tolist()
+    [5.0, 1.0]
+    >>> parse_loot("Ghost Recon's ground forces won an immense triumph and stole $1,234 and 56 Food.") is None
+    True
+    >>> parse_loot(None) is None
+    True
+    """
+    if not text or "won the war and looted" not in text:
+        return None
+    end = text.find(" Food.")
+    # the amounts follow the last "looted" before the food
+    start = text.rfind("looted", 0, end) + 7
+    amounts = [float(amount.replace(",", "")) for amount in LOOT_AMOUNT.findall(text, start, end)] if end != -1 else []
+    if len(amounts) != len(RESOURCES):
+        return None
+    return array("d", amounts)
+
+def war_loot(attacks: Iterable[dict], nation_id: Union[int, str]) -> Union[array, None]:
+    """
+    Adds up what was looted from a nation in a war, given the attacks of the war as returned by the API. None if nothing was looted.
+
+    >>> war_loot([{"victor": "7", "loot_info": "A won the war and looted 10 Money, 0 Coal, 0 Oil, 0 Uranium, 0 Iron, 0 Bauxite, 0 Lead, 0 Gasoline, 0 Munitions, 0 Steel, 0 Aluminum, and 5 Food. "}], "3").tolist()
+    [10.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 5.0]
+    >>> war_loot([{"victor": "3", "loot_info": "B won the war and looted 10 Money, 0 Coal, 0 Oil, 0 Uranium, 0 Iron, 0 Bauxite, 0 Lead, 0 Gasoline, 0 Munitions, 0 Steel, 0 Aluminum, and 5 Food. "}], "3") is None
+    True
+    """
+    total = None
+    for attack in attacks:
+        # loot of attacks the nation itself won was taken from the other side
+        if int(attack['victor'] or 0) == int(nation_id):
+            continue
+        loot = parse_loot(attack['loot_info'])
+        if loot is None:
+            continue
+        if total is None:
+            total = loot
+        else:
+            total = array("d", map(operator.add, total, loot))
+    return total
+
+def price_vector(prices: dict) -> tuple:
+    """
+    The prices of `modifiers.parse`, in the order of RESOURCES, for `loot_value`.
+    """
+    return tuple(int(prices[resource]) for resource in RESOURCES)
+
+def loot_value(loot: Union[Iterable[float], None], prices: tuple) -> float:
+    """
+    The value of a loot vector at the prices of `price_vector`.
+
+    >>> loot_value([10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 5], (1, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 100))
+    510.0
+    """
+    if loot is None:
+        return 0.0
+    return float(sum(map(operator.mul, loot, prices)))
+
+class City:
+    __slots__ = ("date", "powered", "infrastructure", "land", "counts")
+
+    def __init__(self, city: dict):
+        self.date = city['date']
+        self.powered = city['powered']
+        self.infrastructure = city['infrastructure']
+        self.land = city['land']
+        # one unsigned short per improvement, in the order of CITY_COUNTS
+        self.counts = array("H", [city[field] for field in CITY_COUNTS])
+
+    def to_row(self) -> tuple:
+        return self.date, self.powered, self.infrastructure, self.land, self.counts.tobytes()
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "City":
+        city = cls.__new__(cls)
+        city.date, city.powered, city.infrastructure, city.land, counts = row
+        city.counts = array("H")
+        city.counts.frombytes(counts)
+        return city
+
+    def to_dict(self) -> dict:
+        city = {"date": self.date, "powered": self.powered, "infrastructure": self.infrastructure, "land": self.land}
+        city.update(zip(CITY_COUNTS, self.counts))
+        return city
+
+class War:
+    """
+    A war of a nation. Instead of the attacks, only what was looted from the nation is kept, as a vector made by `war_loot`.
+    """
+    __slots__ = ("date", "winner", "defid", "turnsleft", "loot")
+
+    def __init__(self, war: dict, nation_id: int):
+        self.date = parse_time(war['date'])
+        self.winner = int(war['winner'] or 0)
+        self.defid = int(war['defid'])
+        self.turnsleft = war['turnsleft']
+        if 'loot' in war:
+            self.loot = array("d", war['loot']) if war['loot'] is not None else None
+        else:
+            self.loot = war_loot(war['attacks'], nation_id)
+
+    def to_row(self) -> tuple:
+        return self.date, self.winner, self.defid, self.turnsleft, self.loot.tobytes() if self.loot is not None else None
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "War":
+        war = cls.__new__(cls)
+        war.date, war.winner, war.defid, war.turnsleft, loot = row
+        war.loot = None
+        if loot is not None:
+            war.loot = array("d")
+            war.loot.frombytes(loot)
+        return war
+
+    def to_dict(self) -> dict:
+        return {"turnsleft": self.turnsleft, "date": format_time(self.date), "winner": str(self.winner), "defid": str(self.defid), "loot": self.loot.tolist() if self.loot is not None else None}
+
+class Revenue:
+    """
+    What `/raids` needs from the result of `utils.revenue`, computed ahead of time by the scanner. `version` is the version of `modifiers.cache` it was computed with, and `production` is the net daily production of every resource, in the order of RESOURCES, with money being the net cash income.
+    """
+    __slots__ = ("version", "monetary_net_num", "net_cash_num", "mon_net_txt", "money_txt", "max_infra", "avg_infra", "production")
+
+    def __init__(self, rev_obj: dict, version: int):
+        self.version = version
+        self.monetary_net_num = rev_obj['monetary_net_num']
+        self.net_cash_num = rev_obj['net_cash_num']
+        self.mon_net_txt = rev_obj['mon_net_txt']
+        self.money_txt = rev_obj['money_txt']
+        self.max_infra = rev_obj['max_infra']
+        self.avg_infra = rev_obj['avg_infra']
+        self.production = array("d", [rev_obj['net_cash_num']] + [rev_obj['production'][resource] for resource in RESOURCES[1:]])
+
+    def to_dict(self) -> dict:
+        """
+        The fields of the revenue in the shape `utils.revenue_calc` returns them.
+        """
+        rev_obj = {field: getattr(self, field) for field in self.__slots__[1:-1]}
+        rev_obj['production'] = dict(zip(RESOURCES[1:], self.production[1:]))
+        return rev_obj
+
+class Nation:
+    """
+    The compact form of a nation in the scanner's snapshot. Scalars are slots instead of dict entries, ids are ints, dates are timestamps, projects are bits of a single int, city improvements are packed into arrays and the loot of wars is parsed into vectors. `to_dict` gives back the nation as the API returned it, for `revenue_calc` and the templates, except that wars have a `loot` vector instead of their attacks. `revenue` is set by the scanner, see `NationScanner.compute_revenue`.
+    """
+    __slots__ = SCALARS + ("projects", "alliance", "cities", "wars", "treasures", "digest", "revenue")
+
+    def __init__(self, nation: dict):
+        for field in SCALARS:
+            setattr(self, field, nation.get(field))
+        for field in ID_FIELDS:
+            setattr(self, field, int(nation[field] or 0))
+        for field in TIME_FIELDS:
+            setattr(self, field, parse_time(nation[field]))
+        self.projects = sum(1 << i for i, project in enumerate(PROJECTS) if nation[project])
+        self.alliance = nation['alliance']['name'] if nation['alliance'] else None
+        self.cities = tuple(City(city) for city in nation['cities'])
+        self.wars = tuple(War(war, self.id) for war in nation['wars'])
+        self.treasures = tuple(treasure['name'] for treasure in nation['treasures'])
+        # a hash of everything that was fetched, so that a refetched nation that didn't change can keep its revenue
+        self.digest = zlib.crc32(json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":")).encode())
+        self.revenue = None
+
+    def used_slots(self) -> int:
+        """
+        The number of active defensive wars of the nation.
+        """
+        return sum(1 for war in self.wars if war.turnsleft > 0 and war.defid == self.id)
+
+    def to_row(self) -> tuple:
+        """
+        The nation as a tuple of plain values, for `snapshot`. `from_row` turns it back into a nation without parsing anything again.
+        """
+        return tuple(getattr(self, field) for field in SCALARS), self.projects, self.alliance, tuple(city.to_row() for city in self.cities), tuple(war.to_row() for war in self.wars), self.treasures, self.digest
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Nation":
+        nation = cls.__new__(cls)
+        scalars, nation.projects, nation.alliance, cities, wars, nation.treasures, nation.digest = row
+        for field, value in zip(SCALARS, scalars):
+            setattr(nation, field, value)
+        nation.cities = tuple(City.from_row(city) for city in cities)
+        nation.wars = tuple(War.from_row(war) for war in wars)
+        nation.revenue = None
+        return nation
+
+    def scalars(self) -> dict:
+        """
+        The scalar fields of the nation as the API returned them.
+        """
+        nation = {field: getattr(self, field) for field in SCALARS}
+        for field in ID_FIELDS:
+            nation[field] = str(nation[field])
+        for field in TIME_FIELDS:
+            nation[field] = format_time(nation[field])
+        return nation
+
+    def to_dict(self) -> dict:
+        nation = self.scalars()
+        for i, project in enumerate(PROJECTS):
+            nation[project] = bool(self.projects >> i & 1)
+        nation['alliance'] = {"name": self.alliance} if self.alliance is not None else None
+        nation['cities'] = [city.to_dict() for city in self.cities]
+        nation['wars'] = [war.to_dict() for war in self.wars]
+        nation['treasures'] = [{"name": name} for name in self.treasures]
+        return nation
@@ -0,0 +1,227 @@
+import asyncio
+import pathlib
+import time
+from datetime import datetime
+import api
+import modifiers
+import queries
+import records
+import snapshot
+import store
+import utils
+
+def fingerprint(nation: dict) -> tuple:
+    """
+    The fields of a nation that tell whether it has changed since it was last fetched in full.
+    """
+    return tuple(nation.get(field) for field in queries.NATION_FINGERPRINT.fields)
+
+def ingest(nations: list) -> tuple:
+    """
+    Turns nations as returned by the API into `records.Nation`, keyed by id. Also returns their fingerprints. This is slow for many nations, so it is meant to be run in a worker thread.
+    """
+    converted = {}
+    fingerprints = {}
+    for nation in nations:
+        id = int(nation['id'])
+        fingerprints[id] = fingerprint(nation)
+        converted[id] = records.Nation(nation)
+    return converted, fingerprints
+
+def load_snapshot(path: pathlib.Path) -> tuple:
+    """
+    Reads a snapshot written by the scanner. Returns its header, the nations keyed by id and their fingerprints, or None if there is no snapshot that can be read. Meant to be run in a worker thread.
+    """
+    result = snapshot.read(path)
+    if result is None:
+        return None
+    header, nations = result
+    return header, {nation.id: nation for nation in nations}, {nation.id: fingerprint(nation.scalars()) for nation in nations}
+
+def compute_revenue(nations: list, mods: tuple, version: int) -> int:
+    """
+    Sets the `revenue` of the nations that don't have one for `version` of the modifiers yet. Returns how many were computed. This is slow for many nations, so it is meant to be run in a worker thread.
+    """
+    colors, prices, treasures, radiation, seasonal_mod = mods
+    computed = 0
+    for nation in nations:
+        if nation.revenue is not None and nation.revenue.version == version:
+            continue
+        try:
+            nation.revenue = records.Revenue(utils.revenue(nation.to_dict(), radiation, treasures, prices, colors, seasonal_mod), version)
+        except (KeyError, IndexError, ZeroDivisionError, ValueError):
+            # nations without cities and the like are left to `utils.revenue_calc`, like before
+            continue
+        computed += 1
+    return computed
+
+class NationScanner:
+    """
+    Keeps a snapshot of every nation that is not in vacation mode, with the fields `/raids` needs, as `records.Nation` keyed by id, and publishes it to a `store.NationStore`. Pages are fetched `concurrency` at a time through a `api.PageScheduler`, paced by the client's rate limiter.
+
+    A full scan downloads every nation with all its wars and cities, which takes a long time. In between full scans, a delta scan only downloads the fingerprint of every nation (activity, score, color, alliance, beige, military and war counts). Nations whose fingerprint changed are then fetched in full by id, `page_size` ids per request, and merged into the snapshot, and nations that disappeared are dropped. If more than `full_fraction` of the nations changed, a full scan is run instead. Full scans still run every `full_interval` seconds to catch anything the fingerprint misses.
+
+    The revenue of every nation is computed after each scan, for the nations that changed and for every nation once the modifiers of a new turn are in, so that `/raids` doesn't have to.
+    """
+
+    def __init__(self, pnw: api.PnWClient, nation_store: store.NationStore, *, interval: float = 300, full_interval: float = 21600, full_fraction: float = 0.5, concurrency: int = 4, page_size: int = api.MAX_PAGE_SIZE, snapshot_path: pathlib.Path = None):
+        self.pnw = pnw
+        self.store = nation_store
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.full_interval = full_interval
+        self.full_fraction = full_fraction
+        self.concurrency = concurrency
+        self.page_size = page_size
+        # metrics of the last cycle
+        self.cycle_time = 0
+        self.pages = 0
+        self.failures = 0
+        self.nations = {}
+        self.fingerprints = {}
+        self.last_fetched = 0
+        self.last_full = 0
+        self.last_changed = 0
+        self.last_revenue = 0
+        self.index = None
+        self._changed = []
+        self._removed = []
+
+    async def load(self) -> None:
+        """
+        Continues from the stored snapshot, so that a restart doesn't require a full scan. The binary snapshot is read if it is at least as recent as the store, which is slower to load from.
+        """
+        self.last_fetched = await self.store.meta("last_fetched", 0)
+        self.last_full = await self.store.meta("last_full", 0)
+        header = snapshot.read_header(self.snapshot_path) if self.snapshot_path is not None else None
+        loaded = None
+        if header is not None and header.fetched >= self.last_fetched:
+            loaded = await asyncio.get_running_loop().run_in_executor(None, load_snapshot, self.snapshot_path)
+        if loaded is not None:
+            header, self.nations, self.fingerprints = loaded
+            self.last_fetched = round(header.fetched)
+            self.last_full = round(header.last_full)
+        else:
+            self.nations, self.fingerprints = await self._ingest(await self.store.all())
+        await self.build_index()
+        await self.compute_revenue()
+
+    async def build_index(self) -> None:
+        """
+        Builds a `store.ScoreIndex` of the snapshot in a worker thread, and swaps it in once it is done, so that readers always see a complete index.
+        """
+        index = await asyncio.get_running_loop().run_in_executor(None, store.ScoreIndex, list(self.nations.values()), self.last_fetched)
+        self.index = index
+
+    async def compute_revenue(self) -> None:
+        """
+        Precomputes the revenue of the nations whose revenue is missing or was computed with older modifiers, in a worker thread. Does nothing until the modifiers were fetched.
+        """
+        mods = modifiers.cache.get()
+        if mods is None:
+            return
+        self.last_revenue = await asyncio.get_running_loop().run_in_executor(None, compute_revenue, list(self.nations.values()), mods, modifiers.cache.version)
+
+    async def _ingest(self, nations: list) -> tuple:
+        nations, fingerprints = await asyncio.get_running_loop().run_in_executor(None, ingest, nations)
+        # refetched nations that didn't change keep their revenue
+        for id, nation in nations.items():
+            old = self.nations.get(id)
+            if old is not None and old.digest == nation.digest:
+                nation.revenue = old.revenue
+        return nations, fingerprints
+
+    async def _fetch_pages(self, fields: queries.Fragment, name: str) -> tuple:
+        # learns the number of pages first, so that they can all be fetched at once
+        res = await self.pnw.query(queries.nations(None, paginator=queries.LAST_PAGE, page=1, first=self.page_size, vmode=False), f"{name}_last_page", share=False)
+        last_page = res['data']['nations']['paginatorInfo']['lastPage']
+        scheduler = api.PageScheduler(self.pnw, lambda n: queries.nations(fields, page=n, first=self.page_size, vmode=False, orderBy={"column": "DATE", "order": "ASC"}), name, concurrency=self.concurrency, raw=True, share=False)
+        return await self._run(scheduler, last_page)
+
+    async def _fetch_ids(self, ids: list, fields: queries.Fragment, name: str) -> tuple:
+        # the ids are split into pages that are fetched like the pages of a scan, so that they are paced and retried the same way
+        chunks = [[str(id) for id in ids[i:i+self.page_size]] for i in range(0, len(ids), self.page_size)]
+        fields = queries.Fragment("id") + fields
+        scheduler = api.PageScheduler(self.pnw, lambda n: queries.nations(fields, id=chunks[n-1], first=len(chunks[n-1]), vmode=False), name, concurrency=self.concurrency, raw=True, share=False)
+        return await self._run(scheduler, len(chunks))
+
+    async def _run(self, scheduler: api.PageScheduler, last_page: int) -> tuple:
+        pages = await scheduler.run(range(1, last_page+1))
+        self.pages += scheduler.done - len(scheduler.failed)
+        self.failures += len(scheduler.failed)
+        nations = await asyncio.get_running_loop().run_in_executor(None, lambda: [nation for page in pages for nation in api.iter_nations(page)])
+        return nations, not scheduler.failed
+
+    async def full_scan(self) -> None:
+        nations, complete = await self._fetch_pages(queries.RAIDS_TARGET, "scanner_page")
+        nations, fingerprints = await self._ingest(nations)
+        if not complete:
+            # the nations on the pages that failed are unknown, so the old versions of them are kept
+            for id, nation in self.nations.items():
+                if id not in nations:
+                    nations[id] = nation
+                    fingerprints[id] = self.fingerprints[id]
+        self.nations = nations
+        self.fingerprints = fingerprints
+        self.last_changed = len(self.nations)
+        self.last_full = round(datetime.utcnow().timestamp())
+        self._changed = None
+        self._removed = []
+
+    async def delta_scan(self) -> None:
+        nations, complete = await self._fetch_pages(queries.NATION_FINGERPRINT, "scanner_fingerprints")
+        current = {int(nation['id']): fingerprint(nation) for nation in nations}
+        changed = [id for id, print_ in current.items() if self.fingerprints.get(id) != print_]
+        if len(changed) > len(current) * self.full_fraction:
+            # fetching most of the world by id is slower than paging through all of it
+            await self.full_scan()
+            return
+        # nations on pages that failed keep their old fingerprint, so they are fetched again in the next cycle
+        fetched, _ = await self._fetch_ids(changed, queries.RAIDS_TARGET, "scanner_delta")
+        fetched, fingerprints = await self._ingest(fetched)
+
+        # nations that are missing because their page failed are not removed
+        removed = set(id for id in self.nations if id not in current) if complete else set()
+        self._removed = list(removed)
+        self.nations = {id: nation for id, nation in self.nations.items() if id not in removed}
+        self.nations.update(fetched)
+        self.fingerprints = {id: print_ for id, print_ in self.fingerprints.items() if id not in removed}
+        self.fingerprints.update(fingerprints)
+        self._changed = list(fetched.values())
+        self.last_changed = len(fetched)
+
+    async def publish(self) -> None:
+        """
+        Writes what the last scan found to the store and rebuilds the index. After a full scan the stored snapshot is replaced, after a delta scan only the changes are written. The binary snapshot, if there is one, is always written in full.
+        """
+        self.last_fetched = round(datetime.utcnow().timestamp())
+        if self._changed is None:
+            await self.store.replace(self.nations.values(), last_fetched=self.last_fetched, last_full=self.last_full)
+        else:
+            await self.store.update(self._changed, self._removed, last_fetched=self.last_fetched)
+        if self.snapshot_path is not None:
+            await asyncio.get_running_loop().run_in_executor(None, snapshot.write, self.snapshot_path, list(self.nations.values()), self.last_fetched, self.last_full)
+        await self.build_index()
+
+    async def cycle(self) -> None:
+        """
+        Runs a full scan if one is due, or a delta scan otherwise, and publishes the result.
+        """
+        start = time.monotonic()
+        self.pages = 0
+        self.failures = 0
+        if not self.nations or datetime.utcnow().timestamp() - self.last_full >= self.full_interval:
+            await self.full_scan()
+            kind = "full"
+        else:
+            await self.delta_scan()
+            # a delta scan that found too many changes runs a full scan instead
+            kind = "full" if self._changed is None else "delta"
+        await self.publish()
+        await self.compute_revenue()
+        self.cycle_time = time.monotonic() - start
+        print(f"{kind} scan: {self.last_changed:,} of {len(self.nations):,} nations fetched in {self.cycle_time:,.0f}s ({self.pages:,} pages, {self.pages_per_second:,.1f} pages/s, {self.failures:,} failed, {self.last_revenue:,} revenues computed)")
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.cycle_time if self.cycle_time else 0.0
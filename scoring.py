@@ -0,0 +1,104 @@
+import heapq
+import math
+from typing import Union
+import numpy as np
+
+# the polynomial the win rate of a battle is approximated with, from the highest power of the ratio of the armies down to the constant
+WINRATE_COEFFICIENTS = (12.832883444301027, -171.668262561212487, 1018.533858483560834, -3529.694284997589875, 7918.373606722701879, -12042.696852729619422, 12637.399722721022044, -9128.535790660698694, 4437.651655224382012, -1378.156072477675025, 245.439740545813436, -18.980551645186498)
+
+def winrate(attacker_value: float, defender_value: float) -> float:
+    """
+    The chance that the attacker wins a single roll of a battle. Above a ratio of 2 the attacker always wins, below 0.4 it never does, and in between the polynomial is evaluated with Horner's method.
+    """
+    try:
+        x = attacker_value / defender_value
+    except ZeroDivisionError:
+        return 1
+    if x > 2:
+        return 1
+    elif x < 0.4:
+        return 0
+    result = 0
+    for coefficient in WINRATE_COEFFICIENTS:
+        result = result * x + coefficient
+    return result
+
+def winrates(attacker_values: Union[float, np.ndarray], defender_values: np.ndarray) -> np.ndarray:
+    """
+    Like `winrate`, for many battles at once.
+    """
+    attacker_values = np.broadcast_to(np.asarray(attacker_values, dtype=np.float64), np.shape(defender_values))
+    defender_values = np.asarray(defender_values, dtype=np.float64)
+    undefended = defender_values == 0
+    x = np.divide(attacker_values, defender_values, out=np.zeros_like(defender_values), where=~undefended)
+    result = np.polyval(WINRATE_COEFFICIENTS, np.clip(x, 0.4, 2))
+    result[x > 2] = 1
+    result[x < 0.4] = 0
+    result[undefended] = 1
+    return result
+
+def _column(targets: list, field: str) -> np.ndarray:
+    return np.fromiter((target[field] for target in targets), dtype=np.float64, count=len(targets))
+
+def score(attacker: dict, targets: list) -> dict:
+    """
+    Scores every target of `/raids` at once.
+    :param attacker: The nation attacking, with `soldiers`, `tanks`, `aircraft` and `ships`.
+    :param targets: The targets, with the same fields and `population`.
+    :return: Arrays, in the order of `targets`, of the win rates of a roll (`groundwin`, `airwin`, `navalwin`), the chances of an immense triumph (`ground_it`, `air_it`, `naval_it`) and the average win chance in percent (`winchance`).
+    """
+    ground = winrates(attacker['soldiers'] * 1.75 + attacker['tanks'] * 40, _column(targets, 'soldiers') * 1.75 + _column(targets, 'tanks') * 40 + _column(targets, 'population') * 0.0025)
+    air = winrates(attacker['aircraft'] * 3, _column(targets, 'aircraft') * 3)
+    naval = winrates(attacker['ships'] * 4, _column(targets, 'ships') * 4)
+    return {
+        "groundwin": ground,
+        "airwin": air,
+        "navalwin": naval,
+        # an immense triumph takes winning all three rolls
+        "ground_it": ground ** 3,
+        "air_it": air ** 3,
+        "naval_it": naval ** 3,
+        "winchance": np.round((ground + air + naval) * 100 / 3),
+    }
+
+def good_target(groundwin: float, loot: float, net_cash: float) -> bool:
+    """
+    The performance filter of `/raids`. Leaves out the targets that are hard to win the ground battle against, that were beiged for nothing last time (loot that rounds to 0, a loot of NaN means it is unknown) or that make less than $10,000 a day.
+    """
+    return groundwin >= .4 and (math.isnan(loot) or round(loot) != 0) and net_cash >= 10000
+
+class TopK:
+    """
+    Keeps the `k` best targets pushed so far, by a key like the monetary net income, in a min-heap. Of targets with the same key, the one pushed with the lower position wins, like in a stable sort.
+
+    `could_enter` tells whether a target with a key of at most `bound` can still make it, so that targets can be skipped before their key is computed.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def could_enter(self, bound: float) -> bool:
+        return len(self._heap) < self.k or bound >= self._heap[0][0]
+
+    def push(self, key: float, position: int, target) -> None:
+        entry = (key, -position, target)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def best(self):
+        """
+        The best target so far, without sorting the rest.
+        """
+        return max(self._heap, key=lambda k: k[:2])[2]
+
+    def items(self) -> list:
+        """
+        The kept targets, from the best to the worst.
+        """
+        return [target for key, position, target in sorted(self._heap, key=lambda k: k[:2], reverse=True)]
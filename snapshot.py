@@ -0,0 +1,75 @@
+import marshal
+import os
+import pathlib
+import struct
+import zlib
+from typing import Iterable, Union
+import records
+
+# magic, format version, layout of the records, marshal version, fetched, last full scan, number of nations
+HEADER = struct.Struct("<4sHIHddI")
+MAGIC = b"ANSN"
+VERSION = 1
+# changes whenever the fields of the records do, so that a snapshot written by an older version of the bot is not misread
+LAYOUT = zlib.crc32(",".join(records.SCALARS + records.PROJECTS + records.CITY_COUNTS + records.RESOURCES).encode())
+
+class Header:
+    __slots__ = ("fetched", "last_full", "count")
+
+    def __init__(self, fetched: float, last_full: float, count: int):
+        self.fetched = fetched
+        self.last_full = last_full
+        self.count = count
+
+def write(path: pathlib.Path, nations: Iterable[records.Nation], fetched: float, last_full: float, level: int = 1) -> int:
+    """
+    Writes the nations to `path` as a header followed by the zlib compressed rows of the nations, encoded with marshal. The file is written next to `path` first and moved into place once complete, so that readers never see half a snapshot.
+    :param level: The zlib compression level. Snapshots are written after every scan, so the fastest one is the default.
+    :return: The size of the snapshot in bytes.
+    """
+    rows = [nation.to_row() for nation in nations]
+    body = zlib.compress(marshal.dumps(rows), level)
+    part = f"{path}.part"
+    with open(part, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, LAYOUT, marshal.version, fetched, last_full, len(rows)))
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(part, path)
+    return HEADER.size + len(body)
+
+def _header(data: bytes) -> Union[Header, None]:
+    if len(data) < HEADER.size:
+        return None
+    magic, version, layout, marshal_version, fetched, last_full, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or layout != LAYOUT or marshal_version != marshal.version:
+        return None
+    return Header(fetched, last_full, count)
+
+def read_header(path: pathlib.Path) -> Union[Header, None]:
+    """
+    Reads only the header of a snapshot, to check how fresh it is without decoding it. None if there is no snapshot this version of the bot can read.
+    """
+    try:
+        with open(path, "rb") as f:
+            return _header(f.read(HEADER.size))
+    except FileNotFoundError:
+        return None
+
+def read(path: pathlib.Path) -> Union[tuple, None]:
+    """
+    Reads a snapshot. Returns `(header, nations)`, or None if there is no snapshot this version of the bot can read.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    header = _header(data)
+    if header is None:
+        return None
+    try:
+        rows = marshal.loads(zlib.decompress(memoryview(data)[HEADER.size:]))
+    except (zlib.error, ValueError, EOFError, TypeError):
+        return None
+    return header, [records.Nation.from_row(row) for row in rows]
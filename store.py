@@ -0,0 +1,214 @@
+import asyncio
+import bisect
+import functools
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Union
+import records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nations (
+    id INTEGER PRIMARY KEY,
+    score REAL NOT NULL,
+    alliance_id INTEGER NOT NULL,
+    color TEXT NOT NULL,
+    last_active REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nations_score ON nations (score);
+CREATE INDEX IF NOT EXISTS nations_alliance_id ON nations (alliance_id);
+CREATE INDEX IF NOT EXISTS nations_color ON nations (color);
+CREATE INDEX IF NOT EXISTS nations_last_active ON nations (last_active);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+def _row(nation: records.Nation) -> tuple:
+    return nation.id, nation.score, nation.alliance_id, nation.color, nation.last_active or 0.0, json.dumps(nation.to_dict(), separators=(",", ":"))
+
+class NationStore:
+    """
+    The nation snapshot of the scanner, kept in SQLite so that `/raids` can load only the nations in its score range and filters instead of the whole world. The database is in WAL mode, so reads are not blocked while the scanner writes.
+
+    Every call runs in a small thread pool, and every thread has its own connection.
+    """
+
+    def __init__(self, path: pathlib.Path, workers: int = 2):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="store")
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    async def _run(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def _write(self, nations: Iterable[records.Nation], removed: Iterable[Union[int, str]], replace: bool, meta: dict) -> None:
+        con = self._connect()
+        with con:
+            if replace:
+                con.execute("DELETE FROM nations")
+            con.executemany("DELETE FROM nations WHERE id = ?", [(int(id),) for id in removed])
+            con.executemany("INSERT OR REPLACE INTO nations VALUES (?, ?, ?, ?, ?, ?)", [_row(nation) for nation in nations])
+            con.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta.items())
+
+    async def replace(self, nations: Iterable[records.Nation], **meta) -> None:
+        """
+        Replaces every stored nation with `nations`, in a single transaction.
+        """
+        await self._run(self._write, nations, (), True, meta)
+
+    async def update(self, nations: Iterable[records.Nation], removed: Iterable[Union[int, str]] = (), **meta) -> None:
+        """
+        Stores `nations`, overwriting older versions of them, and deletes the nations in `removed`, in a single transaction.
+        """
+        await self._run(self._write, nations, removed, False, meta)
+
+    def _meta(self, key: str, default=None):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    async def meta(self, key: str, default=None):
+        return await self._run(self._meta, key, default)
+
+    def _all(self) -> list:
+        return [json.loads(data) for data, in self._connect().execute("SELECT data FROM nations")]
+
+    async def all(self) -> list:
+        return await self._run(self._all)
+
+    def _candidates(self, min_score: float, max_score: float, beige: bool, alliance_id: Union[int, list, None], exclude_alliances: Iterable[Union[int, str]], inactive_days: int, now: float) -> list:
+        sql = "SELECT data FROM nations WHERE score > ? AND score < ?"
+        params = [min_score, max_score]
+        if not beige:
+            sql += " AND color != 'beige'"
+        if alliance_id is not None:
+            alliances = alliance_id if isinstance(alliance_id, (list, tuple)) else [alliance_id]
+            sql += f" AND alliance_id IN ({', '.join('?' * len(alliances))})"
+            params += [int(id) for id in alliances]
+        exclude_alliances = [int(id) for id in exclude_alliances]
+        if exclude_alliances:
+            sql += f" AND alliance_id NOT IN ({', '.join('?' * len(exclude_alliances))})"
+            params += exclude_alliances
+        if inactive_days:
+            sql += " AND last_active <= ?"
+            params.append(now - inactive_days * 86400)
+        return [json.loads(data) for data, in self._connect().execute(sql, params)]
+
+    async def candidates(self, min_score: float, max_score: float, *, beige: bool = True, alliance_id: Union[int, list, None] = None, exclude_alliances: Iterable[Union[int, str]] = (), inactive_days: int = 0) -> list:
+        """
+        Returns the stored nations with a score strictly between `min_score` and `max_score` that match the filters.
+        :param beige: Whether to include beige nations.
+        :param alliance_id: Only include nations in this alliance, or in one of these alliances.
+        :param exclude_alliances: Leave out nations in these alliances.
+        :param inactive_days: Only include nations that have been inactive for at least this many days.
+        """
+        return await self._run(self._candidates, min_score, max_score, beige, alliance_id, exclude_alliances, inactive_days, time.time())
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+class ScoreIndex:
+    """
+    A read-only, score-sorted index over a snapshot of `records.Nation`, for range queries that don't touch the rest of the world. A score range is found by bisection, and the other filters are bitmaps (Python ints, one bit per position in score order) that are combined with `&`. Beige nations, nations without an alliance and the number of used defensive slots each have bitmaps, and bitmaps of other alliances are made when first needed.
+
+    The index never changes after it is built. When the snapshot changes, a new index is built and swapped in. `fetched` is when the nations in it were fetched, which tells indexes apart.
+    """
+
+    def __init__(self, nations: Iterable[records.Nation], fetched: float = 0):
+        self.fetched = fetched
+        self.nations = sorted(nations, key=lambda k: k.score)
+        self.scores = [nation.score for nation in self.nations]
+        beige = []
+        slots = [[], [], [], []]
+        self._positions = {}
+        for i, nation in enumerate(self.nations):
+            if nation.color == "beige":
+                beige.append(i)
+            slots[min(nation.used_slots(), 3)].append(i)
+            self._positions.setdefault(nation.alliance_id, []).append(i)
+        self.beige = self._bitmap(beige)
+        self.slots = [self._bitmap(positions) for positions in slots]
+        # nations without an alliance are made into a bitmap up front, since one this large would take long to make while someone waits for it
+        self._alliances = {0: self._bitmap(self._positions.get(0, []))}
+
+    def _bitmap(self, positions: Iterable[int]) -> int:
+        # setting the bits one by one on an int would copy the whole int every time
+        bits = bytearray(len(self.nations) // 8 + 1)
+        for i in positions:
+            bits[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(bits, "little")
+
+    def __len__(self) -> int:
+        return len(self.nations)
+
+    def alliance(self, alliance_id: Union[int, str]) -> int:
+        """
+        Returns the bitmap of the members and applicants of an alliance.
+        """
+        alliance_id = int(alliance_id)
+        bitmap = self._alliances.get(alliance_id)
+        if bitmap is None:
+            bitmap = self._alliances[alliance_id] = self._bitmap(self._positions.get(alliance_id, []))
+        return bitmap
+
+    def select(self, min_score: float, max_score: float, *, beige: bool = True, alliance_id: Union[int, list, None] = None, exclude_alliances: Iterable[Union[int, str]] = (), max_wars: int = 3, inactive_days: int = 0) -> list:
+        """
+        Returns the positions of the nations with a score strictly between `min_score` and `max_score` that match the filters. Takes the same filters as `NationStore.candidates`, and `max_wars` for the most used defensive slots.
+        """
+        lo = bisect.bisect_right(self.scores, min_score)
+        hi = bisect.bisect_left(self.scores, max_score)
+        if hi <= lo:
+            return []
+        mask = (1 << hi) - (1 << lo)
+        if not beige:
+            mask &= ~self.beige
+        if alliance_id is not None:
+            allowed = 0
+            for id in (alliance_id if isinstance(alliance_id, (list, tuple)) else [alliance_id]):
+                allowed |= self.alliance(id)
+            mask &= allowed
+        for id in exclude_alliances:
+            mask &= ~self.alliance(id)
+        if max_wars < 3:
+            allowed = 0
+            for slots in self.slots[:max_wars+1]:
+                allowed |= slots
+            mask &= allowed
+        positions = []
+        cutoff = time.time() - inactive_days * 86400
+        # the set bits are found in the binary string of the mask, which is a lot quicker than shifting a 50k bit int around for every one of them
+        bits = bin(mask >> lo)[:1:-1]
+        i = bits.find("1")
+        while i != -1:
+            if not inactive_days or (self.nations[lo + i].last_active or 0) <= cutoff:
+                positions.append(lo + i)
+            i = bits.find("1", i + 1)
+        return positions
+
+    def records(self, *args, **kwargs) -> list:
+        """
+        Like `select`, but returns the `records.Nation` themselves. They are shared, so they must not be modified.
+        """
+        return [self.nations[i] for i in self.select(*args, **kwargs)]
+
+    def candidates(self, *args, **kwargs) -> list:
+        """
+        Like `select`, but returns the nations themselves, as new dicts.
+        """
+        return [nation.to_dict() for nation in self.records(*args, **kwargs)]
@@ -0,0 +1,85 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Union
+
+class Job:
+    """
+    A background task that runs `func` over and over, waiting `delay()` seconds between runs.
+    """
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], delay: Callable[[], float], wait: Union[Callable[[], Awaitable], None] = None):
+        self.name = name
+        self.func = func
+        self.delay = delay
+        self.wait = wait
+        self.runs = 0
+        self.failures = 0
+        self.failing = False
+        self.last_success = None
+        self.last_error = None
+        self.cycle_duration = None
+
+class Supervisor:
+    """
+    Runs the bot's background loops in the bot's event loop. When a run raises, the error is handed to `on_error` and the job is run again after an exponential backoff, from `min_backoff` up to `max_backoff` seconds. A successful run resets the backoff.
+    """
+
+    def __init__(self, on_error: Callable[[Job, Exception], Awaitable] = None, *, min_backoff: float = 5, max_backoff: float = 600):
+        self.on_error = on_error
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.jobs = {}
+        self._tasks = []
+
+    def add(self, name: str, func: Callable[[], Awaitable], delay: Union[float, Callable[[], float]], wait: Callable[[], Awaitable] = None) -> Job:
+        """
+        Adds a job.
+        :param func: Does a single run of the job.
+        :param delay: The seconds to wait after a successful run, or a function returning them.
+        :param wait: Awaited once before the first run, for example `bot.wait_until_ready`.
+        """
+        job = Job(name, func, delay if callable(delay) else (lambda: delay), wait)
+        self.jobs[name] = job
+        return job
+
+    async def _run(self, job: Job) -> None:
+        if job.wait is not None:
+            await job.wait()
+        backoff = self.min_backoff
+        while True:
+            start = time.monotonic()
+            try:
+                await job.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                job.failures += 1
+                job.failing = True
+                job.last_error = f"{type(error).__name__}: {error}"
+                if self.on_error is not None:
+                    try:
+                        await self.on_error(job, error)
+                    except Exception as report_error:
+                        print(f"Could not report error in {job.name}: {report_error!r}")
+                await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+            job.runs += 1
+            job.failing = False
+            job.last_success = time.time()
+            job.cycle_duration = time.monotonic() - start
+            backoff = self.min_backoff
+            await asyncio.sleep(max(job.delay(), 0))
+
+    def start(self, loop: asyncio.AbstractEventLoop = None) -> None:
+        """
+        Starts every job as a task in `loop`, or in the running loop.
+        """
+        loop = loop or asyncio.get_event_loop()
+        self._tasks = [loop.create_task(self._run(job)) for job in self.jobs.values()]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
@@ -0,0 +1,44 @@
+"""
+Compares the memory the scanner's snapshot takes as dicts, like the API returns them, with the memory it takes as `records.Nation`.
+
+Usage: python tools/memory_report.py [path to nations.db]
+The snapshot is read from the store the bot writes, which is `nations.db` in the working directory by default.
+"""
+import json
+import pathlib
+import sqlite3
+import sys
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import records
+
+def measure(build) -> tuple:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+def main(path: pathlib.Path):
+    if not path.exists():
+        print(f"{path} does not exist, run the bot until the scanner has published a snapshot first")
+        sys.exit(1)
+    con = sqlite3.connect(path)
+    rows = [data for data, in con.execute("SELECT data FROM nations")]
+    con.close()
+    if not rows:
+        print(f"{path} has no nations yet")
+        sys.exit(1)
+
+    nations, as_dicts = measure(lambda: [json.loads(data) for data in rows])
+    converted, as_records = measure(lambda: [records.Nation(nation) for nation in nations])
+    print(f"{len(nations):,} nations")
+    print(f"{'form':<10}{'total':>16}{'per nation':>14}")
+    for form, size in (("dicts", as_dicts), ("records", as_records)):
+        print(f"{form:<10}{size:>16,}{size // len(nations):>14,}")
+    print(f"saved {1 - as_records / max(as_dicts, 1):.0%}")
+
+if __name__ == "__main__":
+    main(pathlib.Path(sys.argv[1]) if len(sys.argv) > 1 else pathlib.Path.cwd() / "nations.db")
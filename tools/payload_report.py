@@ -0,0 +1,47 @@
+"""
+Compares the response size of the queries every command used to send with the queries built from `queries.py`.
+
+Usage: python tools/payload_report.py <nation id> [min score] [max score]
+The api key is read from the `api_key` environment variable, like the bot does.
+"""
+import asyncio
+import os
+import pathlib
+import sys
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import api
+import queries
+
+OLD_TARGET_FIELDS = "id flag nation_name last_active leader_name continent dompolicy population alliance_id beigeturns score color soldiers tanks aircraft ships missiles nukes bounties{amount war_type} treasures{name} alliance{name} wars{date winner defid turnsleft attacks{loot_info victor moneystolen}} alliance_position num_cities ironw bauxitew armss egr massirr itc recycling_initiative telecom_satellite green_tech clinical_research_center specialized_police_training uap cities{date powered infrastructure land oilpower windpower coalpower nuclearpower coalmine oilwell uramine barracks farm policestation hospital recyclingcenter subway supermarket bank mall stadium leadmine ironmine bauxitemine gasrefinery aluminumrefinery steelmill munitionsfactory factory airforcebase drydock}"
+OLD_WHO_FIELDS = "id nation_name discord leader_name num_cities cia spy_satellite warpolicy population dompolicy flag vmode color beigeturns last_active soldiers tanks aircraft ships nukes missiles mlp nrf vds irond wars{attid turnsleft} cities{barracks factory airforcebase drydock} score alliance_position alliance_seniority alliance{name id score color nations{id}}"
+OLD_BATTLE_FIELDS = "nation_name population warpolicy id soldiers tanks aircraft ships irond vds cities{infrastructure land} wars{groundcontrol airsuperiority navalblockade attpeace defpeace attid defid att_fortify def_fortify turnsleft war_type}"
+OLD_REVENUE_FIELDS = "nation_name leader_name id continent color warpolicy cia dompolicy alliance_id alliance{name id} num_cities soldiers tanks aircraft ships missiles nukes wars{date turnsleft attid winner att_gas_used att_mun_used att_steel_used att_alum_used def_infra_destroyed_value def_gas_used def_mun_used def_steel_used def_alum_used att_infra_destroyed_value attacks{loot_info victor moneystolen}} ironw bauxitew armss egr massirr itc recycling_initiative telecom_satellite green_tech clinical_research_center specialized_police_training uap cities{id date powered infrastructure land oilpower windpower coalpower nuclearpower coalmine oilwell uramine barracks farm policestation hospital recyclingcenter subway supermarket bank mall stadium leadmine ironmine bauxitemine gasrefinery aluminumrefinery steelmill munitionsfactory factory airforcebase drydock}"
+
+async def main(nation_id: str, min_score: float, max_score: float):
+    pnw = api.PnWClient(os.getenv("api_key"), reuse_window=0)
+    page = f"page:1 first:50 min_score:{min_score} max_score:{max_score} vmode:false"
+    commands = {
+        "raids (per page)": (f"{{nations({page}){{data{{{OLD_TARGET_FIELDS}}}}}}}", queries.nations(queries.RAIDS_TARGET, page=1, first=50, min_score=min_score, max_score=max_score, vmode=False)),
+        "who": (f"{{nations(first:1 id:{nation_id}){{data{{{OLD_WHO_FIELDS}}}}}}}", queries.nations(queries.WHO, first=1, id=nation_id)),
+        "battlesim/damage": (f"{{nations(first:1 id:{nation_id}){{data{{{OLD_BATTLE_FIELDS}}}}}}}", queries.nations(queries.BATTLE + queries.WARS_STATUS, first=1, id=nation_id)),
+        "revenue (single nation)": (f"{{nations(first:1 id:{nation_id}){{data{{{OLD_REVENUE_FIELDS}}}}}}}", queries.nations(queries.REVENUE, first=1, id=nation_id)),
+    }
+    print(f"{'command':<25}{'before':>12}{'after':>12}{'saved':>8}")
+    try:
+        for command, (old, new) in commands.items():
+            await pnw.query(old, f"{command} before", share=False)
+            await pnw.query(new, f"{command} after", share=False)
+            before = pnw.stats[f"{command} before"]['bytes']
+            after = pnw.stats[f"{command} after"]['bytes']
+            print(f"{command:<25}{before:>12,}{after:>12,}{1 - after / max(before, 1):>8.0%}")
+    finally:
+        await pnw.close()
+
+if __name__ == "__main__":
+    load_dotenv()
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 1000, float(sys.argv[3]) if len(sys.argv) > 3 else 2000))
@@ -0,0 +1,65 @@
+"""
+Compares the size and cold load time of the binary snapshot of the scanner with those of the same nations as a JSON file, like `nations.json` used to be, and with loading them from the SQLite store.
+
+Usage: python tools/snapshot_report.py [path to nations.db]
+The nations are read from the store the bot writes, which is `nations.db` in the working directory by default.
+"""
+import json
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import records
+import snapshot
+
+def timed(func) -> tuple:
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+def main(path: pathlib.Path):
+    if not path.exists():
+        print(f"{path} does not exist, run the bot until the scanner has published a snapshot first")
+        sys.exit(1)
+    con = sqlite3.connect(path)
+    rows = [data for data, in con.execute("SELECT data FROM nations")]
+    con.close()
+    if not rows:
+        print(f"{path} has no nations yet")
+        sys.exit(1)
+    nations = [records.Nation(json.loads(data)) for data in rows]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = pathlib.Path(directory) / "nations.json"
+        snapshot_path = pathlib.Path(directory) / "nations.snapshot"
+        with open(json_path, "w") as f:
+            json.dump([nation.to_dict() for nation in nations], f)
+        snapshot.write(snapshot_path, nations, time.time(), time.time())
+
+        def load_json():
+            with open(json_path, "r") as f:
+                return [records.Nation(nation) for nation in json.load(f)]
+
+        def load_store():
+            con = sqlite3.connect(path)
+            try:
+                return [records.Nation(json.loads(data)) for data, in con.execute("SELECT data FROM nations")]
+            finally:
+                con.close()
+
+        results = [
+            ("json", json_path.stat().st_size, timed(load_json)[1]),
+            ("sqlite", path.stat().st_size, timed(load_store)[1]),
+            ("snapshot", snapshot_path.stat().st_size, timed(lambda: snapshot.read(snapshot_path))[1]),
+        ]
+
+    print(f"{len(nations):,} nations")
+    print(f"{'format':<10}{'size':>16}{'load':>10}")
+    for form, size, seconds in results:
+        print(f"{form:<10}{size:>16,}{seconds:>9.2f}s")
+
+if __name__ == "__main__":
+    main(pathlib.Path(sys.argv[1]) if len(sys.argv) > 1 else pathlib.Path.cwd() / "nations.db")
@@ -4,14 +4,10 @@ import asyncio
 import json
 from datetime import datetime
 from typing import Union, Tuple
-import aiohttp
 import re
 import os
-import pymongo
-
-client = pymongo.MongoClient(os.getenv("pymongolink"))
-version = os.getenv("version")
-mongo = client[str(version)]
+import queries
+import modifiers
 
 api_key = os.getenv("api_key")
 
@@ -47,16 +43,14 @@ async def reaction_checker(self, message: discord.Message, embeds: list) -> None
             await message.edit(content="**Command timed out!**")
             break
 
-def find_user(self, arg):
+async def find_user(db, self, arg):
     if isinstance(arg, str):
         arg = arg.strip()
     found = False
 
-    db = mongo.global_users
-
     try:
         int(arg)
-        x = db.find_one({"id": str(arg)})
+        x = await db.users.get_by_nation(arg)
         if x:
             found = True
             return x        
@@ -65,29 +59,27 @@ def find_user(self, arg):
     
     if not found:
         try:
-            x = db.find_one({"user": int(arg)})
+            x = await db.users.get(int(arg))
             if x:
                 found = True
                 return x        
         except:
             pass
-            
-    current = list(db.find({}))
 
     if not found:
         try:
             members = self.bot.get_all_members()
             for member in members:
                 if arg.lower() in member.name.lower():
-                    x = db.find_one({"user": member.id})
+                    x = await db.users.get(member.id)
                     found = True
                     return x
                 elif arg.lower() in member.display_name.lower():
-                    x = db.find_one({"user": member.id})
+                    x = await db.users.get(member.id)
                     found = True
                     return x
                 elif str(member).lower() == arg.lower():
-                    x = db.find_one({"user": member.id})
+                    x = await db.users.get(member.id)
                     found = True
                     return x
         except:
@@ -95,6 +87,7 @@ def find_user(self, arg):
 
     if not found:
         try:
+            current = await db.users.all()
             for x in current:
                 if x['id'] == re.sub("[^0-9]", "", arg):
                     found = True
@@ -107,39 +100,29 @@ def find_user(self, arg):
 
     return {}   
 
-def find_nation(arg: Union[str, int]) -> Union[dict, None]:
+async def find_nation(db, arg: Union[str, int]) -> Union[dict, None]:
     if isinstance(arg, str):
         arg = arg.strip()
     try:
-        arg = int(re.sub("[^0-9]", "", arg))
-        result = list(mongo.world_nations.find({"id": str(arg)}).collation(
-            {"locale": "en", "strength": 1}))[0]
-    except:
-        try:
-            result = list(mongo.world_nations.find({"nation_name": arg}).collation(
-                {"locale": "en", "strength": 1}))[0]
-        except:
-            try:
-                result = list(mongo.world_nations.find({"leader_name": arg}).collation(
-                    {"locale": "en", "strength": 1}))[0]
-            except:
-                try:
-                    result = list(mongo.world_nations.find({"discord": arg}).collation(
-                        {"locale": "en", "strength": 1}))[0]
-                except:
-                    result = None
+        result = await db.nations.find_one("id", str(int(re.sub("[^0-9]", "", arg))))
+    except (TypeError, ValueError):
+        result = None
+    for field in ["nation_name", "leader_name", "discord"]:
+        if result is not None:
+            break
+        result = await db.nations.find_one(field, arg)
     return result
 
-def find_nation_plus(self, arg: Union[str, int]) -> Union[dict, None]: # only returns a nation if it is at least 1 hour old
+async def find_nation_plus(db, self, arg: Union[str, int]) -> Union[dict, None]: # only returns a nation if it is at least 1 hour old
     if isinstance(arg, str):
         arg = arg.strip()
-    nation = find_nation(arg)
+    nation = await find_nation(db, arg)
     if nation == None:
-        nation = find_user(self, arg)
+        nation = await find_user(db, self, arg)
         if nation == {}:
             return None
         else:
-            nation = find_nation(nation['id'])
+            nation = await find_nation(db, nation['id'])
             if nation == None:
                 return None
     return nation
@@ -345,56 +328,41 @@ def expansion_cost(current: int, end: int, infra: int, land: int, *, up: bool =
 
     return output
 
-async def pre_revenue_calc(api_key, message: discord.Message, query_for_nation: bool = False, nationid: Union[int, str] = None, parsed_nation: dict = None):
-    async with aiohttp.ClientSession() as session:
-        if query_for_nation:
-            async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{nations(first:1 id:{nationid}){{data{{nation_name leader_name id continent color warpolicy cia dompolicy alliance_id alliance{{name id}} num_cities soldiers tanks aircraft ships missiles nukes wars{{date turnsleft attid winner att_gas_used att_mun_used att_steel_used att_alum_used def_infra_destroyed_value def_gas_used def_mun_used def_steel_used def_alum_used att_infra_destroyed_value attacks{{loot_info victor moneystolen}}}} ironw bauxitew armss egr massirr itc recycling_initiative telecom_satellite green_tech clinical_research_center specialized_police_training uap cities{{id date powered infrastructure land oilpower windpower coalpower nuclearpower coalmine oilwell uramine barracks farm policestation hospital recyclingcenter subway supermarket bank mall stadium leadmine ironmine bauxitemine gasrefinery aluminumrefinery steelmill munitionsfactory factory airforcebase drydock}}}}}}}}"}) as temp:
-                nation = (await temp.json())['data']['nations']['data']
-            if len(nation) == 0:
-                print("That person was not in the API!")
-                raise 
-            else:
-                nation = nation[0]
+async def pre_revenue_calc(pnw, message: discord.Message, query_for_nation: bool = False, nationid: Union[int, str] = None, parsed_nation: dict = None):
+    if query_for_nation:
+        nation = (await pnw.query(queries.nations(queries.REVENUE, first=1, id=nationid), "revenue_nation"))['data']['nations']['data']
+        if len(nation) == 0:
+            print("That person was not in the API!")
+            raise 
         else:
-            nation = parsed_nation
+            nation = nation[0]
+    else:
+        nation = parsed_nation
 
+    if not modifiers.cache.fresh:
         await message.edit(content="Getting income modifiers...")
-        async with session.post(f"https://api.politicsandwar.com/graphql?api_key={api_key}", json={'query': f"{{colors{{color turn_bonus}} game_info{{game_date radiation{{global north_america south_america africa europe asia australia antarctica}}}} tradeprices(page:1 first:1){{data{{coal oil uranium iron bauxite lead gasoline munitions steel aluminum food}}}} treasures{{bonus nation{{id alliance_id}}}}}}"}) as temp:
-            res_colors = (await temp.json())['data']['colors']
-        colors = {}
-        for color in res_colors:
-            colors[color['color']] = color['turn_bonus'] * 12
+    colors, prices, treasures, radiation, seasonal_mod = await modifiers.cache.load(pnw)
 
-        prices = (await temp.json())['data']['tradeprices']['data'][0]
-        prices['money'] = 1
+    return nation, colors, prices, treasures, radiation, seasonal_mod
 
-        treasures = (await temp.json())['data']['treasures']
-
-        game_info = (await temp.json())['data']['game_info']
+async def revenue_calc(message: discord.Message, nation: dict, radiation: dict, treasures: dict, prices: dict, colors: dict, seasonal_mod: dict, build: str = None, single_city: bool = False, include_spies: bool = False, pnw=None) -> dict:
+    if build != None:
+        try:
+            build = json.loads(build)
+        except json.JSONDecodeError:
+            await message.edit(content="Something is wrong with the build you sent!")
+            return
+    spies = 0
+    if include_spies and not single_city:
+        spies = await spy_calc(pnw, nation)
+    return revenue(nation, radiation, treasures, prices, colors, seasonal_mod, build, single_city, spies)
 
-        rad = game_info['radiation']
-        radiation = {"na": 1 - (rad['north_america'] + rad['global'])/1000, "sa": 1 - (rad['south_america'] + rad['global'])/1000, "eu": (rad['europe'] + rad['global'])/1000, "as": 1 - (rad['asia'] + rad['global'])/1000, "af": 1 - (rad['africa'] + rad['global'])/1000, "au": 1 - (rad['australia'] + rad['global'])/1000, "an": 1 - (rad['antarctica'] + rad['global'])/1000}
-        
-        month = int(game_info['game_date'][5:7])
-        seasonal_mod = {"na": 1, "sa": 1, "eu": 1, "as": 1, "af": 1, "au": 1, "an": 0.5}
-        if month in [6,7,8]:
-            seasonal_mod['na'] = 1.2
-            seasonal_mod['as'] = 1.2
-            seasonal_mod['eu'] = 1.2
-            seasonal_mod['sa'] = 0.8
-            seasonal_mod['af'] = 0.8
-            seasonal_mod['au'] = 0.8
-        elif month in [12,1,2]:
-            seasonal_mod['na'] = 0.8
-            seasonal_mod['as'] = 0.8
-            seasonal_mod['eu'] = 0.8
-            seasonal_mod['sa'] = 1.2
-            seasonal_mod['af'] = 1.2
-            seasonal_mod['au'] = 1.2
-
-        return nation, colors, prices, treasures, radiation, seasonal_mod
-
-async def revenue_calc(message: discord.Message, nation: dict, radiation: dict, treasures: dict, prices: dict, colors: dict, seasonal_mod: dict, build: str = None, single_city: bool = False, include_spies: bool = False) -> dict:
+def revenue(nation: dict, radiation: dict, treasures: dict, prices: dict, colors: dict, seasonal_mod: dict, build: dict = None, single_city: bool = False, spies: int = 0) -> dict:
+    """
+    The part of `revenue_calc` that doesn't wait for anything, so that it can also run in a worker thread, like when the scanner precomputes the revenue of every nation.
+    :param build: A build that was already decoded.
+    :param spies: The number of spies the nation has, for their upkeep.
+    """
     max_commerce = 100
     base_com = 0
     hos_dis_red = 2.5
@@ -472,11 +440,6 @@ async def revenue_calc(message: discord.Message, nation: dict, radiation: dict,
     food = 0
 
     if build != None:
-        try:
-            build = json.loads(build)
-        except json.JSONDecodeError:
-            await message.edit(content="Something is wrong with the build you sent!")
-            return
         land = 0
         for city in nation['cities']:
             land += city['land']
@@ -670,8 +633,7 @@ async def revenue_calc(message: discord.Message, nation: dict, radiation: dict,
         for war in nation['wars']:
             if war['turnsleft'] > 0:
                 at_war = True
-        if include_spies: 
-            military_upkeep += await spy_calc(nation) * 2400
+        military_upkeep += spies * 2400
         if not at_war:
             military_upkeep += nation['soldiers'] * 1.25
             food -= nation['soldiers'] / 750
@@ -732,6 +694,7 @@ async def revenue_calc(message: discord.Message, nation: dict, radiation: dict,
         return rev_obj
     else:
         rev_obj['nation'] = nation
+        rev_obj['production'] = {"coal": coal, "oil": oil, "uranium": uranium, "iron": iron, "bauxite": bauxite, "lead": lead, "gasoline": gasoline, "munitions": munitions, "steel": steel, "aluminum": aluminum, "food": food}
     rev_obj['footer'] = footer
     rev_obj['max_infra'] = max_infra
     rev_obj['avg_infra'] = round(total_infra / nation['num_cities'])
@@ -742,35 +705,33 @@ async def revenue_calc(message: discord.Message, nation: dict, radiation: dict,
     rev_obj['money_txt']=f"${round(money_income * policy_bonus * new_player_bonus * nation_treasure_bonus + color_bonus - power_upkeep - rss_upkeep - military_upkeep * mil_cost - civil_upkeep):,}{starve_money_text}"
     return rev_obj
 
-async def spy_calc(nation: dict) -> int:
+async def spy_calc(pnw, nation: dict) -> int:
     """
     Nation must include 'warpolicy', 'cia' and 'id'
     """
-    async with aiohttp.ClientSession() as session:
-        if nation['warpolicy'] == "Arcane":
-            percent = 57.5
-        elif nation['warpolicy'] == "Tactician":
-            percent = 42.5
+    if nation['warpolicy'] == "Arcane":
+        percent = 57.5
+    elif nation['warpolicy'] == "Tactician":
+        percent = 42.5
+    else:
+        percent = 50
+    upper_lim = 60
+    lower_lim = 0
+    while True:
+        spycount = math.floor((upper_lim + lower_lim)/2)
+        probability = await pnw.get_text(f"https://politicsandwar.com/war/espionage_get_odds.php?id1=341326&id2={nation['id']}&id3=0&id4=1&id5={spycount}", "spy_odds")
+        #print(probability, spycount, upper_lim, lower_lim)
+        if "Greater than 50%" in probability:
+            upper_lim = spycount
         else:
-            percent = 50
-        upper_lim = 60
-        lower_lim = 0
-        while True:
-            spycount = math.floor((upper_lim + lower_lim)/2)
-            async with session.get(f"https://politicsandwar.com/war/espionage_get_odds.php?id1=341326&id2={nation['id']}&id3=0&id4=1&id5={spycount}") as probability:
-                probability = await probability.text()
-            #print(probability, spycount, upper_lim, lower_lim)
-            if "Greater than 50%" in probability:
-                upper_lim = spycount
-            else:
-                lower_lim = spycount
-            if upper_lim - 1 == lower_lim:
-                break
-        enemyspy = round((((100*int(spycount))/(percent-25))-2)/3)
-        if enemyspy > 60:
-            enemyspy = 60
-        elif enemyspy > 50 and not nation['cia']:
-            enemyspy = 50
-        elif enemyspy < 2:
-            enemyspy = 0
+            lower_lim = spycount
+        if upper_lim - 1 == lower_lim:
+            break
+    enemyspy = round((((100*int(spycount))/(percent-25))-2)/3)
+    if enemyspy > 60:
+        enemyspy = 60
+    elif enemyspy > 50 and not nation['cia']:
+        enemyspy = 50
+    elif enemyspy < 2:
+        enemyspy = 0
     return enemyspy
\ No newline at end of file